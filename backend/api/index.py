@@ -1,10 +1,92 @@
-from http.server import BaseHTTPRequestHandler
-import json
-
-class handler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        self.send_response(200)
-        self.send_header("Content-type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps({"message": "Hello from Python!"}).encode())
-        return
\ No newline at end of file
+"""Serverless entry point: exposes server.app as an ASGI ``app``.
+
+The module is imported once per container, so the Motor client, the office
+geofence cache and the other module-level state in server.py survive across
+warm invocations. Startup hooks run once per container, on the lifespan
+startup event or on the first request if the platform sends none. Lifespan
+shutdown (container teardown) runs the app's shutdown hooks.
+
+SERVERLESS=1 keeps the cold start light: index creation, the default admin
+check, pool warm-up and the revocation scan are skipped (the scan runs on the
+first authenticated request). Run ``python backend/manage.py bootstrap`` at
+deploy time to create the indexes and the default admin.
+
+Import and startup cost are logged on the cold start and returned to the
+client in a Server-Timing header on the first response.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+IMPORT_STARTED = time.perf_counter()
+os.environ.setdefault("SERVERLESS", "1")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+logger = logging.getLogger(__name__)
+
+
+class ServerlessApp:
+    def __init__(self, asgi_app):
+        self.app = asgi_app
+        self.started = False
+        self.startup_seconds = None
+        self.invocations = 0
+        self._lock = asyncio.Lock()
+
+    async def startup(self):
+        if self.started:
+            return
+        async with self._lock:
+            if self.started:
+                return
+            started = time.perf_counter()
+            await self.app.router.startup()
+            self.startup_seconds = time.perf_counter() - started
+            self.started = True
+            logger.info(
+                f"Cold start: import {IMPORT_SECONDS * 1000:.0f}ms, startup {self.startup_seconds * 1000:.0f}ms"
+            )
+
+    def server_timing(self) -> bytes:
+        return f"import;dur={IMPORT_SECONDS * 1000:.1f}, startup;dur={self.startup_seconds * 1000:.1f}".encode()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.app.router.shutdown()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        await self.startup()
+        self.invocations += 1
+        if self.invocations > 1:
+            return await self.app(scope, receive, send)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", self.server_timing())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_timing)
+
+
+app = ServerlessApp(server.app)
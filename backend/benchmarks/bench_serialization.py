@@ -0,0 +1,85 @@
+"""Per-1000-document cost of the list endpoint serialization paths.
+
+Compares the original path (``Task(**doc)`` followed by FastAPI's
+``response_model`` validation and JSON rendering) with the fast path used by
+``list_response`` (projected documents, no validation, orjson).
+
+    cd backend && python benchmarks/bench_serialization.py
+"""
+import json
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import orjson  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from server import LeaveRequest, Task, fast_serialize  # noqa: E402
+
+DOCS = 1000
+ROUNDS = 20
+
+
+def make_tasks(n):
+    now = datetime.utcnow()
+    return [{
+        "id": str(uuid.uuid4()),
+        "title": f"Task {i}",
+        "description": "Benchmark task description",
+        "category": "Development",
+        "priority": "medium",
+        "assigned_to": str(uuid.uuid4()),
+        "created_by": str(uuid.uuid4()),
+        "estimated_hours": 4.0,
+        "actual_hours": None,
+        "status": "pending",
+        "due_date": now + timedelta(days=i % 30),
+        "version": 0,
+        "created_at": now,
+        "updated_at": now,
+    } for i in range(n)]
+
+
+def make_leaves(n):
+    now = datetime.utcnow()
+    return [{
+        "id": str(uuid.uuid4()),
+        "user_id": str(uuid.uuid4()),
+        "start_date": now + timedelta(days=5),
+        "end_date": now + timedelta(days=7),
+        "reason": "Benchmark leave",
+        "leave_type": "casual",
+        "status": "pending",
+        "approved_by": None,
+        "created_at": now,
+        "updated_at": now,
+    } for i in range(n)]
+
+
+def validated_path(model, docs):
+    adapter = TypeAdapter(List[model])
+    items = [model(**doc) for doc in docs]
+    content = adapter.dump_python(adapter.validate_python(items, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(model, docs):
+    return orjson.dumps(fast_serialize(model, docs))
+
+
+def bench(name, model, make_docs):
+    docs = make_docs(DOCS)
+    slow = min(timeit.repeat(lambda: validated_path(model, docs), number=1, repeat=ROUNDS))
+    fast = min(timeit.repeat(lambda: fast_path(model, [dict(d) for d in docs]), number=1, repeat=ROUNDS))
+    print(f"{name:<14} validated: {slow * 1000:7.2f} ms   fast: {fast * 1000:7.2f} ms   speedup: {slow / fast:5.1f}x")
+
+
+if __name__ == "__main__":
+    print(f"Serialization cost per {DOCS} documents (best of {ROUNDS})")
+    bench("Task", Task, make_tasks)
+    bench("LeaveRequest", LeaveRequest, make_leaves)
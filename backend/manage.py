@@ -0,0 +1,57 @@
+import asyncio
+from typing import Optional
+
+import typer
+
+import server
+
+cli = typer.Typer(help="Team Management Dashboard maintenance commands")
+
+
+@cli.callback()
+def main():
+    pass
+
+
+@cli.command("rebuild-rollups")
+def rebuild_rollups(user_id: Optional[str] = typer.Option(None, help="Only rebuild this user's rollups")):
+    """Recompute attendance rollups from raw attendance records."""
+    counts = asyncio.run(server.rebuild_attendance_rollups(user_id))
+    for period, count in counts.items():
+        typer.echo(f"{period}: {count} rollups")
+
+
+@cli.command("dedupe-attendance")
+def dedupe_attendance(dry_run: bool = typer.Option(False, "--dry-run", help="Only report what would be removed")):
+    """Remove duplicate attendance rows that block the unique (user_id, date) index.
+
+    Keeps a checked-out row if there is one, else the earliest check-in, and
+    rebuilds the affected users' rollups. Run bootstrap afterwards to build
+    the index.
+    """
+    counts = asyncio.run(server.dedupe_attendance(dry_run=dry_run))
+    verb = "Would remove" if dry_run else "Removed"
+    typer.echo(f"{verb} {counts['rows']} duplicate attendance rows for {counts['users']} users")
+
+
+@cli.command("bootstrap")
+def bootstrap():
+    """Create and verify indexes and the default admin user.
+
+    Run at deploy time for serverless deployments, whose cold starts skip it.
+    """
+    async def run():
+        problems = await server.bootstrap_indexes()
+        await server.ensure_default_admin()
+        return problems
+
+    problems = asyncio.run(run())
+    for problem in problems:
+        typer.echo(f"Index check failed - {problem}", err=True)
+    if problems:
+        raise typer.Exit(code=1)
+    typer.echo(f"Verified {len(server.INDEX_SPECS)} indexes")
+
+
+if __name__ == "__main__":
+    cli()
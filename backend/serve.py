@@ -0,0 +1,99 @@
+import os
+from pathlib import Path
+
+import typer
+import uvicorn
+from dotenv import load_dotenv
+
+BACKEND_DIR = Path(__file__).parent
+
+# Settings that must point at shared MongoDB-backed state once more than one
+# worker serves requests: (env var, required value, default, what breaks)
+MULTI_WORKER_SETTINGS = [
+    ("EVENT_BUS_BACKEND", "changestream", "memory",
+     "/api/events/stream clients never see writes handled by other workers"),
+    ("LOGIN_THROTTLE_BACKEND", "mongo", "memory",
+     "each worker keeps its own login budget, multiplying the allowed attempts"),
+]
+
+# Process-local state that has no shared backend; more than one worker is
+# allowed, but these are reported at startup so operators know the caveat
+MULTI_WORKER_LIMITATIONS = [
+    "/api/metrics counters are per worker; each scrape reaches one worker at random, "
+    "so Prometheus sees counters jump and reset",
+]
+
+
+def process_local_settings() -> list:
+    return [
+        f"{name}={os.environ.get(name, default)} (set {name}={required}): {problem}"
+        for name, required, default, problem in MULTI_WORKER_SETTINGS
+        if os.environ.get(name, default) != required
+    ]
+
+
+def serve(
+    host: str = typer.Option("0.0.0.0", envvar="HOST", help="Interface to bind"),
+    port: int = typer.Option(8000, envvar="PORT", help="Port to bind"),
+    workers: int = typer.Option(1, envvar="WEB_CONCURRENCY", help="Worker processes"),
+    graceful_timeout: int = typer.Option(
+        30, envvar="GRACEFUL_SHUTDOWN_SECONDS", help="Seconds to drain in-flight requests on shutdown"
+    ),
+    forwarded_allow_ips: str = typer.Option(
+        "127.0.0.1",
+        envvar="FORWARDED_ALLOW_IPS",
+        help="Comma-separated proxy addresses trusted to set X-Forwarded-For",
+    ),
+    log_level: str = typer.Option("info", envvar="LOG_LEVEL"),
+):
+    """Serve server:app, optionally across worker processes.
+
+    The supervisor never imports server.py; each worker imports it and opens
+    its own MongoDB client on first use. SIGTERM/SIGINT stop accepting
+    connections, drain in-flight requests and run the shutdown hooks
+    (including shutdown_db_client) in every worker.
+
+    One worker is the default. Running more (WEB_CONCURRENCY) requires
+    EVENT_BUS_BACKEND=changestream (a replica set) and
+    LOGIN_THROTTLE_BACKEND=mongo; startup is refused otherwise. The user and
+    report caches stay per worker, which is safe: revocations are picked up
+    within TOKEN_REVOCATION_REFRESH_SECONDS and cached reports never change.
+    The /api/metrics counters are per worker too and are not aggregated, so
+    scrape a single-worker deployment (or each worker directly) when the
+    counters matter.
+    Every worker opens its own pool, so size MONGO_MIN_POOL_SIZE and
+    MONGO_MAX_POOL_SIZE per worker against the server's connection limit.
+    Pick the worker count from the container's CPU quota; os.cpu_count()
+    reports the host's CPUs.
+
+    The client address (used by the login throttle) is taken from the
+    right-most X-Forwarded-For hop that is not in FORWARDED_ALLOW_IPS. List
+    only the real proxy addresses there: "*" would trust the left-most,
+    client-supplied hop.
+    """
+    load_dotenv(BACKEND_DIR / ".env")
+    if workers > 1:
+        problems = process_local_settings()
+        if problems:
+            typer.echo(f"Refusing to start {workers} workers with process-local state:", err=True)
+            for problem in problems:
+                typer.echo(f"  {problem}", err=True)
+            raise typer.Exit(code=1)
+        for limitation in MULTI_WORKER_LIMITATIONS:
+            typer.echo(f"Warning: {limitation}", err=True)
+
+    uvicorn.run(
+        "server:app",
+        app_dir=str(BACKEND_DIR),
+        host=host,
+        port=port,
+        workers=workers,
+        timeout_graceful_shutdown=graceful_timeout,
+        proxy_headers=True,
+        forwarded_allow_ips=forwarded_allow_ips,
+        log_level=log_level,
+    )
+
+
+if __name__ == "__main__":
+    typer.run(serve)
@@ -1,33 +1,650 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, ValidationError
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 import jwt
-from passlib.context import CryptContext
 import secrets
+import base64
+import binascii
+import json
+import csv
+import io
+import hashlib
+import math
+from email.utils import format_datetime, parsedate_to_datetime
+import time
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import threading
+import contextvars
+import importlib.util
+from pymongo import monitoring
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Metrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+# Per-request scratch space; Motor copies the context into its executor
+# threads, so the command listener can attribute commands to the route
+current_request_metrics: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "current_request_metrics", default=None
+)
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels) -> str:
+    return ",".join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+
+def render_histograms(name: str, help_text: str, histograms: Dict[tuple, Histogram], label_names: tuple) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, histogram in sorted(histograms.items()):
+        labels = dict(zip(label_names, key))
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{{{_labels(**labels, le=bound)}}} {count}')
+        lines.append(f'{name}_bucket{{{_labels(**labels, le="+Inf")}}} {histogram.count}')
+        lines.append(f"{name}_sum{{{_labels(**labels)}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{_labels(**labels)}}} {histogram.count}")
+    return lines
+
+def render_counters(name: str, help_text: str, counters: Dict[tuple, int], label_names: tuple, kind: str = "counter") -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for key, value in sorted(counters.items()):
+        lines.append(f"{name}{{{_labels(**dict(zip(label_names, key)))}}} {value}")
+    return lines
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency: Dict[tuple, Histogram] = {}
+        self.mongo_commands: Dict[tuple, Histogram] = {}
+        self.responses: Dict[tuple, int] = {}
+        self.in_flight = 0
+
+    def record(self, method: str, route: str, status_code: int, seconds: float, mongo_commands: int):
+        key = (method, route)
+        self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+        self.mongo_commands.setdefault(key, Histogram(COUNT_BUCKETS)).observe(mongo_commands)
+        status_key = (method, route, str(status_code))
+        self.responses[status_key] = self.responses.get(status_key, 0) + 1
+
+    def render(self) -> List[str]:
+        lines = render_histograms(
+            "http_request_duration_seconds", "HTTP request latency by route", self.latency, ("method", "route")
+        )
+        lines += render_counters(
+            "http_responses_total", "HTTP responses by route and status", self.responses, ("method", "route", "status")
+        )
+        lines += render_histograms(
+            "http_request_mongodb_commands", "MongoDB commands issued per request", self.mongo_commands, ("method", "route")
+        )
+        lines += ["# HELP http_requests_in_flight Requests currently being served",
+                  "# TYPE http_requests_in_flight gauge",
+                  f"http_requests_in_flight {self.in_flight}"]
+        return lines
+
+# Records per-collection/command latency; runs on pymongo's threads
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, str] = {}
+        self.latency: Dict[tuple, Histogram] = {}
+        self.commands: Dict[tuple, int] = {}
+
+    def started(self, event):
+        collection = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+        request_metrics = current_request_metrics.get()
+        if request_metrics is not None:
+            request_metrics["mongo_commands"] += 1
+
+    def _finish(self, event, outcome: str):
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), "")
+            key = (collection, event.command_name)
+            self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(event.duration_micros / 1e6)
+            count_key = (collection, event.command_name, outcome)
+            self.commands[count_key] = self.commands.get(count_key, 0) + 1
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+    def render(self) -> List[str]:
+        with self._lock:
+            latency = dict(self.latency)
+            commands = dict(self.commands)
+        lines = render_histograms(
+            "mongodb_command_duration_seconds", "MongoDB command latency", latency, ("collection", "command")
+        )
+        lines += render_counters(
+            "mongodb_commands_total", "MongoDB commands by outcome", commands, ("collection", "command", "outcome")
+        )
+        return lines
+
+# Per process: with several serve.py workers each scrape sees one worker only
+route_metrics = RouteMetrics()
+mongo_command_metrics = MongoCommandMetrics()
+
+# Slow command profiling (opt-in: SLOW_QUERY_MS > 0)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '0'))
+SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS', '300'))
+SLOW_QUERY_MAX_SHAPES = int(os.environ.get('SLOW_QUERY_MAX_SHAPES', '200'))
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Driver/session bookkeeping that is neither part of the shape nor accepted inside explain
+COMMAND_ENVELOPE_FIELDS = {
+    "lsid", "txnNumber", "autocommit", "startTransaction", "$db", "$clusterTime",
+    "$readPreference", "readConcern", "writeConcern", "signature",
+}
+
+def command_shape(value):
+    if isinstance(value, dict):
+        return {key: command_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = command_shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+def request_route() -> str:
+    request_metrics = current_request_metrics.get()
+    if request_metrics is None:
+        return "background"
+    return getattr(request_metrics["scope"].get("route"), "path", "unmatched")
+
+PLAN_VALUE_FIELDS = {"filter", "parsedQuery", "indexBounds"}
+
+def redact_plan(plan):
+    if isinstance(plan, dict):
+        return {
+            key: command_shape(value) if key in PLAN_VALUE_FIELDS else redact_plan(value)
+            for key, value in plan.items()
+        }
+    if isinstance(plan, list):
+        return [redact_plan(item) for item in plan]
+    return plan
+
+def plan_stages(plan: Dict) -> List[str]:
+    stages = []
+    pending = [plan]
+    while pending:
+        node = pending.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            stages.append(node["stage"])
+        pending.extend(node.get("inputStages", []))
+        for key in ("inputStage", "queryPlan", "winningPlan"):
+            if key in node:
+                pending.append(node[key])
+    return stages
+
+# Logs commands slower than the threshold and captures an explain plan per
+# command shape in the background; the listener runs on pymongo's threads
+class SlowCommandMonitor(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float, explain_interval_seconds: float, max_shapes: int):
+        self.threshold_ms = threshold_ms
+        self.explain_interval_seconds = explain_interval_seconds
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._pending: Dict[tuple, tuple] = {}
+        self._shapes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client = None
+        self._tasks = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def start(self, loop: asyncio.AbstractEventLoop, mongo_client):
+        self._loop = loop
+        self._client = mongo_client
+
+    def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._loop = None
+
+    def started(self, event):
+        if not self.enabled or event.command_name == "explain":
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (event.command, request_route())
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        if not self.enabled or event.command_name == "explain":
+            return
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if pending is None or duration_ms < self.threshold_ms:
+            return
+        
+        command, route = pending
+        body = {key: value for key, value in command.items() if key not in COMMAND_ENVELOPE_FIELDS}
+        collection = body.get("collection" if event.command_name == "getMore" else event.command_name)
+        collection = collection if isinstance(collection, str) else ""
+        shape = {event.command_name: collection}
+        shape.update(command_shape({key: value for key, value in body.items() if key != event.command_name}))
+        shape_key = json.dumps([event.database_name, shape], sort_keys=True)
+        logger.warning(
+            f"Slow MongoDB command {event.database_name}.{collection} {event.command_name} "
+            f"took {duration_ms:.1f}ms on {route}: {json.dumps(shape, sort_keys=True)}"
+        )
+        
+        now = time.time()
+        with self._lock:
+            entry = self._shapes.get(shape_key)
+            if entry is None:
+                entry = {
+                    "database": event.database_name,
+                    "collection": collection,
+                    "command": event.command_name,
+                    "shape": shape,
+                    "routes": {},
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "last_ms": 0.0,
+                    "last_seen": None,
+                    "plan": None,
+                    "plan_stages": [],
+                    "collection_scan": None,
+                    "explained_at": None,
+                    "explain_error": None,
+                    "_explain_requested": 0.0,
+                }
+                self._shapes[shape_key] = entry
+            self._shapes.move_to_end(shape_key)
+            while len(self._shapes) > self.max_shapes:
+                self._shapes.popitem(last=False)
+            entry["routes"][route] = entry["routes"].get(route, 0) + 1
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+            entry["last_ms"] = duration_ms
+            entry["last_seen"] = now
+            explain = (
+                event.command_name in EXPLAINABLE_COMMANDS
+                and now - entry["_explain_requested"] >= self.explain_interval_seconds
+            )
+            if explain:
+                entry["_explain_requested"] = now
+        
+        if explain and self._loop is not None:
+            for key in ("updates", "deletes"):
+                if key in body:
+                    # explain only accepts a single write statement
+                    body[key] = body[key][:1]
+            try:
+                self._loop.call_soon_threadsafe(self._schedule_explain, shape_key, event.database_name, body)
+            except RuntimeError:
+                pass
+
+    def _schedule_explain(self, shape_key: str, database: str, command: Dict):
+        task = asyncio.ensure_future(self._explain(shape_key, database, command))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, shape_key: str, database: str, command: Dict):
+        plan, error = None, None
+        try:
+            result = await self._client[database].command({"explain": command, "verbosity": "queryPlanner"})
+            plan = result.get("queryPlanner", {}).get("winningPlan")
+            if plan is None and "stages" in result:
+                plan = result["stages"][0].get("$cursor", {}).get("queryPlanner", {}).get("winningPlan")
+        except PyMongoError as e:
+            error = str(e)
+        
+        stages = plan_stages(plan) if plan else []
+        plan = redact_plan(plan)
+        with self._lock:
+            entry = self._shapes.get(shape_key)
+            if entry is None:
+                return
+            entry["plan"] = plan
+            entry["plan_stages"] = stages
+            entry["collection_scan"] = "COLLSCAN" in stages if plan else None
+            entry["explained_at"] = time.time()
+            entry["explain_error"] = error
+        if "COLLSCAN" in stages:
+            logger.warning(f"Slow MongoDB command shape on {entry['database']}.{entry['collection']} uses a collection scan")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = [dict(entry, routes=dict(entry["routes"])) for entry in self._shapes.values()]
+        for entry in entries:
+            entry.pop("_explain_requested")
+            entry["avg_ms"] = round(entry["total_ms"] / entry["count"], 3)
+            for key in ("last_seen", "explained_at"):
+                if entry[key] is not None:
+                    entry[key] = datetime.fromtimestamp(entry[key], timezone.utc)
+        return sorted(entries, key=lambda entry: entry["max_ms"], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._shapes.clear()
+
+slow_command_monitor = SlowCommandMonitor(SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS, SLOW_QUERY_MAX_SHAPES)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        status_code = 500
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        request_metrics = {"mongo_commands": 0, "scope": scope}
+        token = current_request_metrics.set(request_metrics)
+        route_metrics.in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route_metrics.in_flight -= 1
+            current_request_metrics.reset(token)
+            route = scope.get("route")
+            route_metrics.record(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status_code,
+                time.perf_counter() - started,
+                request_metrics["mongo_commands"]
+            )
+
 # MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '5000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', 'zstd,snappy,zlib')
+MONGO_WARMUP_TIMEOUT_SECONDS = float(os.environ.get('MONGO_WARMUP_TIMEOUT_SECONDS', '10'))
+MONGO_WARMUP_MAX_RETRY_SECONDS = float(os.environ.get('MONGO_WARMUP_MAX_RETRY_SECONDS', '30'))
+
+# Wire compressors whose optional packages are importable, in preference order
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+def available_compressors(names: str) -> List[str]:
+    compressors = []
+    for name in (name.strip() for name in names.split(",")):
+        module = COMPRESSOR_MODULES.get(name)
+        if module and importlib.util.find_spec(module) is not None:
+            compressors.append(name)
+    return compressors
+
+# Tracks connection pool state per server; runs on pymongo's threads
+class ConnectionPoolMonitor(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools: Dict[str, Dict[str, Any]] = {}
+        self.warmed_up = False
+        self.warmup_seconds: Optional[float] = None
+
+    def _pool(self, address) -> Dict[str, Any]:
+        key = f"{address[0]}:{address[1]}"
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {
+                "ready": False, "open": 0, "in_use": 0, "created": 0, "closed": 0,
+                "checkout_failures": 0, "cleared": 0,
+            }
+        return pool
+
+    def _update(self, address, **changes):
+        with self._lock:
+            pool = self._pool(address)
+            for key, value in changes.items():
+                pool[key] = value if isinstance(value, bool) else pool[key] + value
+
+    def pool_created(self, event):
+        self._update(event.address)
+
+    def pool_ready(self, event):
+        self._update(event.address, ready=True)
+
+    def pool_cleared(self, event):
+        self._update(event.address, ready=False, cleared=1)
+
+    def pool_closed(self, event):
+        self._update(event.address, ready=False)
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, created=1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1, closed=1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, checkout_failures=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, in_use=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, in_use=-1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pools = {address: dict(pool) for address, pool in self.pools.items()}
+        return {
+            "open": sum(pool["open"] for pool in pools.values()),
+            "in_use": sum(pool["in_use"] for pool in pools.values()),
+            "checkout_failures": sum(pool["checkout_failures"] for pool in pools.values()),
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "warmed_up": self.warmed_up,
+            "warmup_seconds": self.warmup_seconds,
+            "pools": pools,
+        }
+
+mongo_pool_monitor = ConnectionPoolMonitor()
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "event_listeners": [mongo_command_metrics, slow_command_monitor, mongo_pool_monitor],
+    }
+    compressors = available_compressors(MONGO_COMPRESSORS)
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    return AsyncIOMotorClient(os.environ['MONGO_URL'], **options)
+
+async def warm_up_mongo_client(mongo_client: AsyncIOMotorClient):
+    # Concurrent pings force the pool to open minPoolSize connections now
+    # rather than on the first requests after a deploy
+    started = time.perf_counter()
+    pings = max(MONGO_MIN_POOL_SIZE, 1)
+    await asyncio.wait_for(
+        asyncio.gather(*(mongo_client.admin.command("ping") for _ in range(pings))),
+        timeout=MONGO_WARMUP_TIMEOUT_SECONDS
+    )
+    mongo_pool_monitor.warmed_up = True
+    mongo_pool_monitor.warmup_seconds = round(time.perf_counter() - started, 3)
+
+# Started when a startup step finds MongoDB unreachable (e.g. briefly during a
+# deploy): warms the pool, then runs the deferred steps in order, so the app
+# still starts and readiness recovers without a restart
+mongo_warmup_task: Optional[asyncio.Task] = None
+deferred_startup: List = []
+
+async def retry_mongo_warm_up():
+    delay = 1.0
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            if not mongo_pool_monitor.warmed_up:
+                await warm_up_mongo_client(client)
+                logger.info(f"MongoDB pool warmed up in {mongo_pool_monitor.warmup_seconds}s after retrying")
+            while deferred_startup:
+                await deferred_startup[0]()
+                deferred_startup.pop(0)
+            return
+        except (PyMongoError, asyncio.TimeoutError) as e:
+            delay = min(delay * 2, MONGO_WARMUP_MAX_RETRY_SECONDS)
+            logger.warning(f"MongoDB startup retry failed, next attempt in {delay:.0f}s: {e}")
+
+def start_mongo_retry():
+    global mongo_warmup_task
+    if mongo_warmup_task is None or mongo_warmup_task.done():
+        mongo_warmup_task = asyncio.create_task(retry_mongo_warm_up())
+
+async def run_or_defer(step):
+    try:
+        await step()
+    except PyMongoError as e:
+        logger.error(f"Startup step {step.__name__} failed, retrying in the background: {e}")
+        deferred_startup.append(step)
+        start_mongo_retry()
+
+# The client is created lazily in each process: one built at import time and
+# inherited across a worker fork would share sockets and monitor threads
+class ProcessLocalClient:
+    def __init__(self, factory):
+        self._factory = factory
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._pid: Optional[int] = None
+
+    def get(self) -> AsyncIOMotorClient:
+        pid = os.getpid()
+        if self._client is None or self._pid != pid:
+            self._client = self._factory()
+            self._pid = pid
+        return self._client
+
+    def close(self):
+        if self._client is not None and self._pid == os.getpid():
+            self._client.close()
+        self._client = None
+        self._pid = None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __getitem__(self, name):
+        return self.get()[name]
+
+class ProcessLocalDatabase:
+    def __init__(self, mongo_client: ProcessLocalClient, name: str):
+        self._mongo_client = mongo_client
+        self._name = name
+        self._database = None
+
+    def get(self):
+        current = self._mongo_client.get()
+        if self._database is None or self._database.client is not current:
+            self._database = current[self._name]
+        return self._database
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __getitem__(self, name):
+        return self.get()[name]
+
+client = ProcessLocalClient(create_mongo_client)
+db = ProcessLocalDatabase(client, os.environ['DB_NAME'])
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 JWT_SECRET = os.environ.get('JWT_SECRET', secrets.token_urlsafe(32))
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '10000'))
+TOKEN_REVOCATION_REFRESH_SECONDS = float(os.environ.get('TOKEN_REVOCATION_REFRESH_SECONDS', '30'))
+EVENT_BUS_BACKEND = os.environ.get('EVENT_BUS_BACKEND', 'memory')  # memory or changestream
+EVENT_QUEUE_SIZE = int(os.environ.get('EVENT_QUEUE_SIZE', '100'))
+EVENT_HEARTBEAT_SECONDS = float(os.environ.get('EVENT_HEARTBEAT_SECONDS', '15'))
+EVENT_STREAM_TOKEN_SECONDS = int(os.environ.get('EVENT_STREAM_TOKEN_SECONDS', '60'))
+PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread')  # thread or process
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '64'))
+LOGIN_THROTTLE_BACKEND = os.environ.get('LOGIN_THROTTLE_BACKEND', 'memory')  # memory or mongo
+LOGIN_THROTTLE_MAX_KEYS = int(os.environ.get('LOGIN_THROTTLE_MAX_KEYS', '100000'))
+LOGIN_USERNAME_BURST = float(os.environ.get('LOGIN_USERNAME_BURST', '5'))
+LOGIN_USERNAME_PER_MINUTE = float(os.environ.get('LOGIN_USERNAME_PER_MINUTE', '5'))
+# Successful logins are refunded, so these bound failed attempts (and
+# concurrent attempts) per client; an office behind one NAT address shares them
+LOGIN_IP_BURST = float(os.environ.get('LOGIN_IP_BURST', '100'))
+LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', '60'))
+OFFICE_CACHE_TTL_SECONDS = float(os.environ.get('OFFICE_CACHE_TTL_SECONDS', '300'))
+EARTH_RADIUS_METERS = 6371000
+MAX_PAGE_SIZE = 1000
+MAX_BULK_TASKS = int(os.environ.get('MAX_BULK_TASKS', '1000'))
+MAX_BULK_LEAVE_DECISIONS = int(os.environ.get('MAX_BULK_LEAVE_DECISIONS', '1000'))
+LATE_CHECK_IN_TIME = os.environ.get('LATE_CHECK_IN_TIME', '09:30')  # HH:MM, UTC
+REPORT_CACHE_MAX_SIZE = int(os.environ.get('REPORT_CACHE_MAX_SIZE', '256'))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+# Set by api/index.py: skips index bootstrap, the default admin check and pool
+# warm-up on cold starts; run `python manage.py bootstrap` at deploy instead
+SERVERLESS = os.environ.get('SERVERLESS', '').lower() in ('1', 'true')
+DEFAULT_PAGE_SIZE = min(int(os.environ.get('DEFAULT_PAGE_SIZE', str(MAX_PAGE_SIZE))), MAX_PAGE_SIZE)
 
 # Create the main app
 app = FastAPI(title="Team Management Dashboard")
@@ -59,6 +676,11 @@ class PasswordChange(BaseModel):
     current_password: str
     new_password: str
 
+class UserUpdate(BaseModel):
+    full_name: Optional[str] = None
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+
 class AttendanceRecord(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -69,6 +691,8 @@ class AttendanceRecord(BaseModel):
     check_out_location: Optional[Dict] = None
     work_location: str = "office"  # office or home
     is_in_office_radius: Optional[bool] = None
+    office_id: Optional[str] = None
+    office_distance_meters: Optional[float] = None
     total_hours: Optional[float] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -84,6 +708,7 @@ class Task(BaseModel):
     actual_hours: Optional[float] = None
     status: str = "pending"  # pending, in_progress, completed
     due_date: datetime
+    version: int = 0  # bumped on every update, for optimistic concurrency
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -108,6 +733,10 @@ class LeaveRequest(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class BulkLeaveDecision(BaseModel):
+    leave_ids: List[str]
+    decision: str  # approved or rejected
+
 class OfficeLocation(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -116,6 +745,345 @@ class OfficeLocation(BaseModel):
     radius_meters: int = 100  # Default 100m radius
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+# Bounded TTL/LRU cache of validated users keyed by username
+class UserCache:
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, username: str) -> Optional["User"]:
+        entry = self._entries.get(username)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[username]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(username)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, username: str, user: "User"):
+        self._entries[username] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(username)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, username: str):
+        self._entries.pop(username, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+user_cache = UserCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+
+# username -> minimum accepted token_version, plus deactivated usernames.
+# Every revocation stamps users.revoked_at, so the background refresh only
+# reads users revoked since the previous pass. An entry is dropped once it is
+# older than the access token lifetime, since every token it revoked has
+# expired by then.
+class TokenRevocations:
+    def __init__(self, refresh_seconds: float, retention: timedelta):
+        self.refresh_seconds = refresh_seconds
+        self.retention = retention
+        self._versions: Dict[str, int] = {}
+        self._inactive: set = set()
+        self._revoked_at: Dict[str, datetime] = {}
+        self._since: Optional[datetime] = None
+        self._task = None
+        self._refresh_lock = asyncio.Lock()
+        self.refreshed_at: Optional[datetime] = None
+
+    def load(self, users: List[Dict], now: datetime):
+        for user in users:
+            revoked_at = user.get("revoked_at") or now
+            if revoked_at.tzinfo is None:
+                revoked_at = revoked_at.replace(tzinfo=timezone.utc)
+            self._merge(user["username"], user.get("token_version", 0), user.get("is_active", True), revoked_at)
+        cutoff = now - self.retention
+        for username in [u for u, revoked_at in self._revoked_at.items() if revoked_at < cutoff]:
+            del self._revoked_at[username]
+            self._versions.pop(username, None)
+            self._inactive.discard(username)
+        self.refreshed_at = now
+
+    async def refresh(self):
+        now = datetime.now(timezone.utc)
+        cutoff = now - self.retention
+        if self._since is None:
+            # Revocations made before revoked_at was recorded are only
+            # picked up by this first full pass
+            query = {"$or": [
+                {"revoked_at": {"$gte": cutoff}},
+                {"revoked_at": {"$exists": False}, "$or": [{"token_version": {"$gt": 0}}, {"is_active": False}]}
+            ]}
+        else:
+            # Overlap the previous pass so slow concurrent writes are not missed
+            query = {"revoked_at": {"$gte": max(cutoff, self._since - timedelta(seconds=self.refresh_seconds))}}
+        users = await db.users.find(
+            query,
+            {"_id": 0, "username": 1, "token_version": 1, "is_active": 1, "revoked_at": 1}
+        ).to_list(None)
+        self.load(users, now)
+        self._since = now
+
+    async def ensure_fresh(self):
+        # Only needed when the background loop is not running (serverless) or
+        # has not managed a first refresh yet (MongoDB unreachable at startup)
+        if self._task is not None and self.refreshed_at is not None:
+            return
+        if self.refreshed_at and (datetime.now(timezone.utc) - self.refreshed_at).total_seconds() < self.refresh_seconds:
+            return
+        async with self._refresh_lock:
+            if self.refreshed_at and (datetime.now(timezone.utc) - self.refreshed_at).total_seconds() < self.refresh_seconds:
+                return
+            await self.refresh()
+
+    def _merge(self, username: str, token_version: int, is_active: bool, revoked_at: datetime):
+        # Versions only ever grow, so keep local bumps newer than a snapshot
+        if token_version:
+            self._versions[username] = max(token_version, self._versions.get(username, 0))
+        if is_active:
+            self._inactive.discard(username)
+        else:
+            self._inactive.add(username)
+        self._revoked_at[username] = max(revoked_at, self._revoked_at.get(username, revoked_at))
+
+    def bump(self, username: str, token_version: int, is_active: bool = True):
+        self._merge(username, token_version, is_active, datetime.now(timezone.utc))
+
+    def is_revoked(self, username: str, token_version: int) -> bool:
+        return username in self._inactive or token_version < self._versions.get(username, 0)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Token revocation refresh failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+token_revocations = TokenRevocations(TOKEN_REVOCATION_REFRESH_SECONDS, timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+# In-process pub/sub feeding the /events/stream push channel. Subscribers get
+# a bounded queue per connection; a slow client loses its oldest events rather
+# than holding memory. Topics are "user:<id>" and ADMIN_TOPIC.
+ADMIN_TOPIC = "admins"
+
+TASK_EVENT_FIELDS = ("id", "title", "status", "assigned_to", "actual_hours", "version", "updated_at")
+LEAVE_EVENT_FIELDS = ("id", "user_id", "status", "approved_by", "start_date", "end_date", "updated_at")
+
+def task_event(event_type: str, task: Dict) -> tuple:
+    payload = {"type": event_type, "task": {f: task.get(f) for f in TASK_EVENT_FIELDS if f in task}}
+    return [f"user:{task.get('assigned_to')}", ADMIN_TOPIC], payload
+
+def leave_event(event_type: str, leave: Dict) -> tuple:
+    payload = {"type": event_type, "leave": {f: leave.get(f) for f in LEAVE_EVENT_FIELDS if f in leave}}
+    return [f"user:{leave.get('user_id')}", ADMIN_TOPIC], payload
+
+class EventBus:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, set] = {}
+        self.backend = None
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, topics: List[str]) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        for topic in topics:
+            self._subscribers.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, topics: List[str]):
+        for topic in topics:
+            queues = self._subscribers.get(topic)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[topic]
+
+    def dispatch(self, topics: List[str], event: Dict):
+        delivered = set()
+        for topic in topics:
+            for queue in self._subscribers.get(topic, ()):
+                if queue in delivered:
+                    continue
+                delivered.add(queue)
+                if queue.full():
+                    queue.get_nowait()
+                    self.dropped += 1
+                queue.put_nowait(event)
+        self.published += 1
+
+    async def publish(self, topics: List[str], event: Dict):
+        if self.backend is not None:
+            await self.backend.publish(topics, event)
+
+    async def start(self, backend_name: str):
+        backends = {"memory": InProcessEventBackend, "changestream": ChangeStreamEventBackend}
+        if backend_name not in backends:
+            raise ValueError(f"Unknown EVENT_BUS_BACKEND: {backend_name}")
+        self.backend = backends[backend_name](self)
+        await self.backend.start()
+
+    async def stop(self):
+        if self.backend is not None:
+            await self.backend.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "topics": len(self._subscribers),
+            "subscriptions": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+# Delivers route publishes directly to this process's subscribers
+class InProcessEventBackend:
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+
+    async def publish(self, topics: List[str], event: Dict):
+        self.bus.dispatch(topics, event)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+# Feeds the bus from MongoDB change streams (replica set only), so every
+# process sees writes made by any process. Route publishes are ignored since
+# the same writes arrive through the stream.
+class ChangeStreamEventBackend:
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+        self._task = None
+
+    async def publish(self, topics: List[str], event: Dict):
+        pass
+
+    async def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _watch(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": ["tasks", "leaves"]},
+            "operationType": {"$in": ["insert", "update", "replace"]}
+        }}]
+        while True:
+            try:
+                async with db.watch(pipeline, full_document="updateLookup") as stream:
+                    async for change in stream:
+                        document = change.get("fullDocument")
+                        if not document:
+                            continue
+                        action = "created" if change["operationType"] == "insert" else "updated"
+                        if change["ns"]["coll"] == "tasks":
+                            topics, event = task_event(f"task.{action}", document)
+                        else:
+                            topics, event = leave_event(f"leave.{action}", document)
+                        self.bus.dispatch(topics, event)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning(f"Change stream interrupted, reconnecting: {e}")
+                await asyncio.sleep(5)
+
+event_bus = EventBus(EVENT_QUEUE_SIZE)
+
+# In-memory office locations answering "inside any office radius" with one
+# vectorized haversine over all offices. Reloaded after create_office_location
+# writes, and every OFFICE_CACHE_TTL_SECONDS to pick up other processes' writes.
+class OfficeGeofence:
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._ids: List[str] = []
+        # numpy arrays once loaded; numpy is imported on first use so cold
+        # starts that never check in do not pay for it
+        self._lat = None
+        self._lng = None
+        self._cos_lat = None
+        self._radii = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    def load(self, offices: List[Dict]):
+        import numpy as np
+        self._ids = [office.get("id") for office in offices]
+        self._lat = np.radians(np.array([office["latitude"] for office in offices], dtype=np.float64))
+        self._lng = np.radians(np.array([office["longitude"] for office in offices], dtype=np.float64))
+        self._cos_lat = np.cos(self._lat)
+        self._radii = np.array([office.get("radius_meters", 100) for office in offices], dtype=np.float64)
+        self._expires_at = time.monotonic() + self.ttl_seconds
+
+    async def _ensure_loaded(self):
+        if time.monotonic() < self._expires_at:
+            return
+        async with self._lock:
+            if time.monotonic() < self._expires_at:
+                return
+            offices = await db.office_locations.find(
+                {}, {"_id": 0, "id": 1, "latitude": 1, "longitude": 1, "radius_meters": 1}
+            ).to_list(None)
+            self.load(offices)
+
+    def distances(self, latitude: float, longitude: float):
+        import numpy as np
+        lat = np.radians(latitude)
+        lng = np.radians(longitude)
+        a = np.sin((self._lat - lat) / 2) ** 2 + np.cos(lat) * self._cos_lat * np.sin((self._lng - lng) / 2) ** 2
+        return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    async def locate(self, latitude: float, longitude: float) -> Dict[str, Any]:
+        await self._ensure_loaded()
+        if not self._ids:
+            return {"is_in_office": False, "office_id": None, "distance_meters": None}
+        import numpy as np
+        distances = self.distances(latitude, longitude)
+        inside = np.where(distances <= self._radii, distances, np.inf)
+        index = int(np.argmin(inside))
+        if not np.isfinite(inside[index]):
+            return {"is_in_office": False, "office_id": None, "distance_meters": None}
+        return {"is_in_office": True, "office_id": self._ids[index], "distance_meters": round(float(distances[index]), 1)}
+
+office_geofence = OfficeGeofence(OFFICE_CACHE_TTL_SECONDS)
+
 # Helper functions
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -124,27 +1092,404 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
+def user_token_claims(user: Dict) -> Dict[str, Any]:
+    return {
+        "sub": user["username"],
+        "role": user["role"],
+        "user_id": user["id"],
+        "email": user["email"],
+        "full_name": user["full_name"],
+        "is_active": user.get("is_active", True),
+        "token_version": user.get("token_version", 0)
+    }
+
+# passlib and bcrypt are imported on the first hash/verify rather than at
+# startup, which keeps them off the cold-start path
+_pwd_context = None
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# Runs bcrypt on a worker pool so hashing never blocks the event loop.
+# Requests beyond max_pending are rejected with 503 instead of queueing.
+class PasswordHasher:
+    def __init__(self, executor_kind: str, workers: int, max_pending: int):
+        self.executor_kind = executor_kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server is busy, please retry", headers={"Retry-After": "1"})
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            elapsed = time.perf_counter() - started
+            self.completed += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+
+    async def verify(self, plain_password, hashed_password) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password) -> str:
+        return await self._run(get_password_hash, password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": min(self.pending, self.workers),
+            "queue_depth": max(0, self.pending - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_latency_ms": round(self.total_seconds / self.completed * 1000, 2) if self.completed else 0.0,
+            "max_latency_ms": round(self.max_seconds * 1000, 2),
+        }
+
+password_hasher = PasswordHasher(PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+# Token buckets in front of bcrypt: take() spends one token and returns 0, or
+# returns the seconds until a token is available; refund() gives it back after
+# a successful login, so the budget is spent on failures. A bucket that has
+# refilled is indistinguishable from a missing one, so idle entries are dropped.
+class MemoryRateLimitBackend:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _prune(self, now: float):
+        while self._buckets:
+            key, (tokens, updated, full_at) = next(iter(self._buckets.items()))
+            if full_at > now and len(self._buckets) <= self.max_keys:
+                break
+            del self._buckets[key]
+
+    def _adjust(self, key: str, capacity: float, rate: float, spend: bool) -> float:
+        now = time.monotonic()
+        tokens, updated, _ = self._buckets.pop(key, (capacity, now, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if not spend:
+            tokens = min(capacity, tokens + 1)
+        elif tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        if tokens < capacity:
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        self._prune(now)
+        return retry_after
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        return self._adjust(key, capacity, rate, spend=True)
+
+    async def refund(self, key: str, capacity: float, rate: float):
+        self._adjust(key, capacity, rate, spend=False)
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+# Shared buckets for multi-worker deployments: one atomic pipeline update per
+# check, with a TTL index removing buckets once they would have refilled
+class MongoRateLimitBackend:
+    def __init__(self, collection: str):
+        self.collection = collection
+
+    @staticmethod
+    def _refill(capacity: float, rate: float, now: datetime) -> Dict:
+        elapsed_seconds = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        return {"$set": {
+            "tokens": {"$min": [capacity, {"$add": [
+                {"$ifNull": ["$tokens", capacity]}, {"$multiply": [elapsed_seconds, rate]}
+            ]}]},
+            "updated_at": now,
+        }}
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        now = datetime.now(timezone.utc)
+        bucket = await db[self.collection].find_one_and_update(
+            {"_id": key},
+            [
+                self._refill(capacity, rate, now),
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {
+                    "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    "expires_at": now + timedelta(seconds=capacity / rate),
+                }},
+            ],
+            projection={"_id": 0, "tokens": 1, "allowed": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return 0.0 if bucket["allowed"] else (1 - bucket["tokens"]) / rate
+
+    async def refund(self, key: str, capacity: float, rate: float):
+        now = datetime.now(timezone.utc)
+        await db[self.collection].update_one(
+            {"_id": key},
+            [
+                self._refill(capacity, rate, now),
+                {"$set": {"tokens": {"$min": [capacity, {"$add": ["$tokens", 1]}]}}},
+            ]
+        )
+
+    def size(self) -> int:
+        return 0
+
+class LoginThrottle:
+    def __init__(self, backend_name: str, max_keys: int, username_burst: float, username_per_minute: float,
+                 ip_burst: float, ip_per_minute: float):
+        self.backend_name = backend_name
+        if backend_name == "mongo":
+            self.backend = MongoRateLimitBackend("rate_limits")
+        else:
+            self.backend = MemoryRateLimitBackend(max_keys)
+        self.username_limit = (username_burst, username_per_minute / 60)
+        self.ip_limit = (ip_burst, ip_per_minute / 60)
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    async def check(self, username: str, ip: Optional[str]):
+        try:
+            # The IP bucket is checked first so a single noisy client does not
+            # drain the per-username budget of the account it is attacking
+            retry_after = await self.backend.take(f"ip:{ip or 'unknown'}", *self.ip_limit)
+            if not retry_after:
+                retry_after = await self.backend.take(f"user:{username.lower()}", *self.username_limit)
+        except PyMongoError as e:
+            # Fail open: a shared-backend outage must not lock everyone out
+            self.errors += 1
+            logger.warning(f"Login throttle backend failed: {e}")
+            return
+        if retry_after:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Too many login attempts, please retry later",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+        self.allowed += 1
+
+    async def refund(self, username: str, ip: Optional[str]):
+        try:
+            await self.backend.refund(f"ip:{ip or 'unknown'}", *self.ip_limit)
+            await self.backend.refund(f"user:{username.lower()}", *self.username_limit)
+        except PyMongoError as e:
+            self.errors += 1
+            logger.warning(f"Login throttle backend failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend_name,
+            "tracked_keys": self.backend.size(),
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+login_throttle = LoginThrottle(
+    LOGIN_THROTTLE_BACKEND, LOGIN_THROTTLE_MAX_KEYS, LOGIN_USERNAME_BURST, LOGIN_USERNAME_PER_MINUTE,
+    LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE
+)
+
+# Keyset pagination: the cursor is the sort-key values of the last document
+# returned, so each page is an index range scan instead of a skip.
+def encode_cursor(values: List[Any]) -> str:
+    payload = [{"$dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+# Cursor values go straight into the query, so only scalars and the
+# {"$dt": ...} wrapper are accepted; any other object could carry an operator
+def _cursor_value(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, dict) and list(value) == ["$dt"] and isinstance(value["$dt"], str):
+        return datetime.fromisoformat(value["$dt"])
+    raise ValueError("unsupported cursor value")
+
+def decode_cursor(cursor: str) -> List[Any]:
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list):
+            raise ValueError("cursor must be a list")
+        return [_cursor_value(v) for v in payload]
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(sort: List[tuple], values: List[Any]) -> Dict:
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        clause[field] = {"$gt" if direction == ASCENDING else "$lt": values[i]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+async def paginate(collection, query: Dict, sort: List[tuple], limit: int, cursor: Optional[str] = None, projection: Optional[Dict] = None):
+    if cursor:
+        values = decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != len(sort):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = {"$and": [query, keyset_filter(sort, values)]}
+    
+    docs = await collection.find(query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor([docs[-1].get(field) for field, _ in sort])
+    return docs, next_cursor
+
+# Fast path for list endpoints: documents written by this app are trusted, so
+# they are projected to the model's fields, topped up with static defaults and
+# handed straight to orjson, skipping both Model(**doc) and response_model
+# validation.
+_model_defaults_cache: Dict[type, Dict[str, Any]] = {}
+
+def model_projection(model) -> Dict[str, int]:
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+def model_defaults(model) -> Dict[str, Any]:
+    defaults = _model_defaults_cache.get(model)
+    if defaults is None:
+        defaults = {
+            name: field.default
+            for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+        _model_defaults_cache[model] = defaults
+    return defaults
+
+def fast_serialize(model, docs: List[Dict]) -> List[Dict]:
+    defaults = model_defaults(model)
+    for doc in docs:
+        for name, value in defaults.items():
+            doc.setdefault(name, value)
+    return docs
+
+def list_response(model, docs: List[Dict], next_cursor: Optional[str] = None, headers: Optional[Dict] = None) -> ORJSONResponse:
+    headers = dict(headers or {})
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return ORJSONResponse(fast_serialize(model, docs), headers=headers)
+
+# Conditional GET: every write to a listed collection bumps its counter in
+# collection_versions. List endpoints derive ETag/Last-Modified from that
+# counter and answer 304 before reading or serializing any documents.
+async def bump_collection_version(collection: str):
+    await db.collection_versions.update_one(
+        {"_id": collection},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+async def conditional_get(request: Request, collection: str, scope: str = ""):
+    version_doc = await db.collection_versions.find_one({"_id": collection}) or {}
+    updated_at = version_doc.get("updated_at")
+    digest = hashlib.sha1(f"{collection}:{version_doc.get('version', 0)}:{scope}".encode()).hexdigest()[:20]
+    headers = {"ETag": f'W/"{digest}"', "Cache-Control": "no-cache"}
+    if updated_at is not None:
+        if updated_at.tzinfo is None:
+            updated_at = updated_at.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+    
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags or headers["ETag"] in tags or headers["ETag"][2:] in tags:
+            return Response(status_code=304, headers=headers), headers
+    elif if_modified_since and updated_at is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            since = None
+        # "-0000" or a missing zone parses to a naive datetime; HTTP dates are GMT
+        if since is not None and since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if since is not None and updated_at.replace(microsecond=0) <= since:
+            return Response(status_code=304, headers=headers), headers
+    return None, headers
+
+async def load_user(username: str) -> User:
+    user = user_cache.get(username)
+    if user is None:
+        user_doc = await db.users.find_one({"username": username})
+        if user_doc is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = User(**user_doc)
+        user_cache.put(username, user)
+    if not user.is_active:
+        raise HTTPException(status_code=401, detail="Account is inactive")
+    return user
+
+async def authenticate_token(token: str, scope: str = "access") -> User:
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("scope", "access") != scope:
             raise HTTPException(status_code=401, detail="Invalid token")
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = await db.users.find_one({"username": username})
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return User(**user)
+    await token_revocations.ensure_fresh()
+    if not payload.get("is_active", True) or token_revocations.is_revoked(username, payload.get("token_version", 0)):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    
+    # Tokens issued before user_id was added to the claims fall back to a lookup
+    if "user_id" not in payload:
+        return await load_user(username)
+    
+    return User.model_construct(
+        id=payload["user_id"],
+        email=payload.get("email", ""),
+        username=username,
+        full_name=payload.get("full_name", ""),
+        role=payload.get("role", "employee"),
+        is_active=True
+    )
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate_token(credentials.credentials)
 
 # Authentication Routes
 @api_router.post("/auth/register")
@@ -158,7 +1503,7 @@ async def register_user(user_data: UserCreate, current_user: User = Depends(get_
         raise HTTPException(status_code=400, detail="User with this email or username already exists")
     
     # Create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user_dict = user_data.dict()
     del user_dict["password"]
     user = User(**user_dict)
@@ -166,37 +1511,69 @@ async def register_user(user_data: UserCreate, current_user: User = Depends(get_
     user_doc["hashed_password"] = hashed_password
     
     await db.users.insert_one(user_doc)
+    await bump_collection_version("users")
     return {"message": "User created successfully", "user": user}
 
 @api_router.post("/auth/login")
-async def login(user_data: UserLogin):
+async def login(user_data: UserLogin, request: Request):
+    client_ip = request.client.host if request.client else None
+    await login_throttle.check(user_data.username, client_ip)
     user = await db.users.find_one({"username": user_data.username})
-    if not user or not verify_password(user_data.password, user["hashed_password"]):
+    if not user or not await password_hasher.verify(user_data.password, user["hashed_password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    await login_throttle.refund(user_data.username, client_ip)
     
     if not user["is_active"]:
         raise HTTPException(status_code=401, detail="Account is inactive")
     
-    access_token = create_access_token(data={"sub": user["username"], "role": user["role"]})
+    access_token = create_access_token(data=user_token_claims(user))
     user_obj = User(**user)
     return {"access_token": access_token, "token_type": "bearer", "user": user_obj}
 
 @api_router.post("/auth/change-password")
-async def change_password(password_data: PasswordChange, current_user: User = Depends(get_current_user)):
+async def change_password(
+    password_data: PasswordChange,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    client_ip = request.client.host if request.client else None
+    await login_throttle.check(current_user.username, client_ip)
     user = await db.users.find_one({"username": current_user.username})
-    if not verify_password(password_data.current_password, user["hashed_password"]):
+    if not await password_hasher.verify(password_data.current_password, user["hashed_password"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
+    await login_throttle.refund(current_user.username, client_ip)
     
-    new_hashed_password = get_password_hash(password_data.new_password)
-    await db.users.update_one(
+    new_hashed_password = await password_hasher.hash(password_data.new_password)
+    now = datetime.now(timezone.utc)
+    user = await db.users.find_one_and_update(
         {"username": current_user.username},
-        {"$set": {"hashed_password": new_hashed_password, "updated_at": datetime.now(timezone.utc)}}
+        {
+            "$set": {"hashed_password": new_hashed_password, "updated_at": now, "revoked_at": now},
+            "$inc": {"token_version": 1}
+        },
+        projection={"_id": 0, "token_version": 1},
+        return_document=ReturnDocument.AFTER
     )
+    user_cache.invalidate(current_user.username)
+    token_revocations.bump(current_user.username, user["token_version"])
+    await bump_collection_version("users")
     return {"message": "Password changed successfully"}
 
+@api_router.post("/auth/logout")
+async def logout(current_user: User = Depends(get_current_user)):
+    # Revokes every token issued to this user so far
+    user = await db.users.find_one_and_update(
+        {"username": current_user.username},
+        {"$inc": {"token_version": 1}, "$set": {"revoked_at": datetime.now(timezone.utc)}},
+        projection={"_id": 0, "token_version": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    token_revocations.bump(current_user.username, user["token_version"])
+    return {"message": "Logged out successfully"}
+
 @api_router.get("/auth/me")
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return current_user
+    return await load_user(current_user.username)
 
 # Office Location Routes
 @api_router.post("/office-locations", response_model=OfficeLocation)
@@ -205,104 +1582,200 @@ async def create_office_location(location: OfficeLocation, current_user: User =
         raise HTTPException(status_code=403, detail="Only admins can create office locations")
     
     await db.office_locations.insert_one(location.dict())
+    office_geofence.invalidate()
+    await bump_collection_version("office_locations")
     return location
 
 @api_router.get("/office-locations", response_model=List[OfficeLocation])
-async def get_office_locations():
-    locations = await db.office_locations.find().to_list(1000)
-    return [OfficeLocation(**loc) for loc in locations]
+async def get_office_locations(request: Request):
+    not_modified, headers = await conditional_get(request, "office_locations")
+    if not_modified:
+        return not_modified
+    locations = await db.office_locations.find({}, model_projection(OfficeLocation)).to_list(1000)
+    return list_response(OfficeLocation, locations, headers=headers)
 
 # Attendance Routes
+def check_in_response(attendance: Dict) -> Dict[str, Any]:
+    return {
+        "message": "Checked in successfully",
+        "is_in_office": attendance.get("is_in_office_radius", False),
+        "office_id": attendance.get("office_id"),
+        "distance_meters": attendance.get("office_distance_meters")
+    }
+
+def repeat_check_in(existing: Optional[Dict], idempotency_key: Optional[str]) -> Dict[str, Any]:
+    if idempotency_key and existing and existing.get("check_in_idempotency_key") == idempotency_key:
+        return check_in_response(existing)
+    raise HTTPException(status_code=400, detail="Already checked in today")
+
 @api_router.post("/attendance/check-in")
-async def check_in(location_data: Dict, current_user: User = Depends(get_current_user)):
+async def check_in(
+    location_data: Dict,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_user)
+):
     today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
     
-    # Check if already checked in today
-    existing = await db.attendance.find_one({"user_id": current_user.id, "date": today})
-    if existing and existing.get("check_in_time"):
-        raise HTTPException(status_code=400, detail="Already checked in today")
-    
     # Check if location is within office radius
-    office_locations = await db.office_locations.find().to_list(1000)
-    is_in_office = False
+    match = {"is_in_office": False, "office_id": None, "distance_meters": None}
+    if location_data.get("latitude") and location_data.get("longitude"):
+        match = await office_geofence.locate(float(location_data["latitude"]), float(location_data["longitude"]))
+    is_in_office = match["is_in_office"]
     
-    if office_locations and location_data.get("latitude") and location_data.get("longitude"):
-        from math import radians, cos, sin, asin, sqrt
-        
-        def haversine(lon1, lat1, lon2, lat2):
-            # Convert decimal degrees to radians
-            lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-            # Haversine formula
-            dlon = lon2 - lon1
-            dlat = lat2 - lat1
-            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-            c = 2 * asin(sqrt(a))
-            r = 6371000  # Radius of earth in meters
-            return c * r
-        
-        user_lat = location_data["latitude"]
-        user_lng = location_data["longitude"]
-        
-        for office in office_locations:
-            distance = haversine(user_lng, user_lat, office["longitude"], office["latitude"])
-            if distance <= office["radius_meters"]:
-                is_in_office = True
-                break
-    
-    attendance_data = {
-        "id": str(uuid.uuid4()),
-        "user_id": current_user.id,
-        "date": today,
-        "check_in_time": datetime.now(timezone.utc),
-        "check_in_location": location_data,
-        "is_in_office_radius": is_in_office,
-        "work_location": "office" if is_in_office else "home",
-        "created_at": datetime.now(timezone.utc)
-    }
+    if not attendance_unique_index:
+        # Without the unique index a missed filter would insert a second row,
+        # so fall back to checking for today's record first
+        existing = await db.attendance.find_one({"user_id": current_user.id, "date": today, "check_in_time": {"$ne": None}})
+        if existing:
+            return repeat_check_in(existing, idempotency_key)
     
-    if existing:
-        await db.attendance.update_one({"_id": existing["_id"]}, {"$set": attendance_data})
-    else:
-        await db.attendance.insert_one(attendance_data)
+    # Only sets check_in_time when it is absent; a second check-in misses the
+    # filter, the upsert collides with the unique (user_id, date) index and fails.
+    now = datetime.now(timezone.utc)
+    try:
+        attendance = await db.attendance.find_one_and_update(
+            {"user_id": current_user.id, "date": today, "check_in_time": None},
+            {
+                "$set": {
+                    "check_in_time": now,
+                    "check_in_location": location_data,
+                    "is_in_office_radius": is_in_office,
+                    "office_id": match["office_id"],
+                    "office_distance_meters": match["distance_meters"],
+                    "work_location": "office" if is_in_office else "home",
+                    "check_in_idempotency_key": idempotency_key
+                },
+                "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": now}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        existing = await db.attendance.find_one({"user_id": current_user.id, "date": today})
+        return repeat_check_in(existing, idempotency_key)
     
-    return {"message": "Checked in successfully", "is_in_office": is_in_office}
+    return check_in_response(attendance)
 
 @api_router.post("/attendance/check-out")
 async def check_out(location_data: Dict, current_user: User = Depends(get_current_user)):
     today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
-    
-    attendance = await db.attendance.find_one({"user_id": current_user.id, "date": today})
-    if not attendance or not attendance.get("check_in_time"):
-        raise HTTPException(status_code=400, detail="No check-in found for today")
-    
-    if attendance.get("check_out_time"):
-        raise HTTPException(status_code=400, detail="Already checked out today")
-    
     check_out_time = datetime.now(timezone.utc)
-    check_in_time = attendance["check_in_time"]
-    if isinstance(check_in_time, str):
-        check_in_time = datetime.fromisoformat(check_in_time.replace('Z', '+00:00'))
-    elif check_in_time.tzinfo is None:
-        check_in_time = check_in_time.replace(tzinfo=timezone.utc)
     
-    total_hours = (check_out_time - check_in_time).total_seconds() / 3600
-    
-    await db.attendance.update_one(
-        {"_id": attendance["_id"]},
-        {"$set": {
+    # total_hours is computed by the server from the stored check_in_time
+    # ($toDate covers both BSON dates and legacy ISO strings)
+    attendance = await db.attendance.find_one_and_update(
+        {"user_id": current_user.id, "date": today, "check_in_time": {"$ne": None}, "check_out_time": None},
+        [{"$set": {
             "check_out_time": check_out_time,
-            "check_out_location": location_data,
-            "total_hours": total_hours
-        }}
+            "check_out_location": {"$literal": location_data},
+            "total_hours": {"$divide": [{"$subtract": [check_out_time, {"$toDate": "$check_in_time"}]}, 3600000]}
+        }}],
+        projection={"_id": 0, "user_id": 1, "date": 1, "work_location": 1, "total_hours": 1},
+        return_document=ReturnDocument.AFTER
     )
     
-    return {"message": "Checked out successfully", "total_hours": round(total_hours, 2)}
+    if attendance is None:
+        existing = await db.attendance.find_one(
+            {"user_id": current_user.id, "date": today},
+            {"_id": 0, "check_in_time": 1, "check_out_time": 1}
+        )
+        if not existing or not existing.get("check_in_time"):
+            raise HTTPException(status_code=400, detail="No check-in found for today")
+        raise HTTPException(status_code=400, detail="Already checked out today")
+    
+    try:
+        await increment_attendance_rollups(attendance)
+    except PyMongoError as e:
+        # The check-out itself is recorded; rebuild-rollups repairs the totals
+        logger.error(f"Failed to update attendance rollups for {attendance['user_id']}: {e}")
+    return {"message": "Checked out successfully", "total_hours": round(attendance["total_hours"], 2)}
 
-@api_router.get("/attendance/today")
-async def get_today_attendance(current_user: User = Depends(get_current_user)):
-    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
-    attendance = await db.attendance.find_one({"user_id": current_user.id, "date": today})
+# Per-user day / ISO-week / month totals, incremented on every check-out so
+# hours reports are single-document lookups instead of attendance scans
+ROLLUP_PERIODS = ("day", "week", "month")
+
+def rollup_keys(date: str) -> Dict[str, str]:
+    day = datetime.strptime(date, '%Y-%m-%d')
+    iso_year, iso_week, _ = day.isocalendar()
+    return {"day": date, "week": f"{iso_year}-W{iso_week:02d}", "month": date[:7]}
+
+def rollup_id(user_id: str, period: str, key: str) -> str:
+    return f"{user_id}|{period}|{key}"
+
+async def increment_attendance_rollups(attendance: Dict):
+    in_office = attendance.get("work_location") == "office"
+    increments = {
+        "hours": attendance.get("total_hours") or 0.0,
+        "days": 1,
+        "office_days": 1 if in_office else 0,
+        "home_days": 0 if in_office else 1
+    }
+    now = datetime.now(timezone.utc)
+    await db.attendance_rollups.bulk_write([
+        UpdateOne(
+            {"_id": rollup_id(attendance["user_id"], period, key)},
+            {
+                "$inc": increments,
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"user_id": attendance["user_id"], "period": period, "key": key}
+            },
+            upsert=True
+        )
+        for period, key in rollup_keys(attendance["date"]).items()
+    ], ordered=False)
+
+def _rollup_key_expression(period: str):
+    if period == "day":
+        return "$date"
+    if period == "month":
+        return {"$substrBytes": ["$date", 0, 7]}
+    week = {"$isoWeek": "$_day"}
+    return {"$concat": [
+        {"$toString": {"$isoWeekYear": "$_day"}},
+        "-W",
+        {"$cond": [{"$lt": [week, 10]}, {"$concat": ["0", {"$toString": week}]}, {"$toString": week}]}
+    ]}
+
+async def rebuild_attendance_rollups(user_id: Optional[str] = None) -> Dict[str, int]:
+    scope = {"user_id": user_id} if user_id else {}
+    await db.attendance_rollups.delete_many(scope)
+    
+    now = datetime.now(timezone.utc)
+    for period in ROLLUP_PERIODS:
+        pipeline = [
+            {"$match": {**scope, "total_hours": {"$ne": None}}},
+            {"$addFields": {"_day": {"$dateFromString": {"dateString": "$date", "format": "%Y-%m-%d"}}}},
+            {"$group": {
+                "_id": {"user_id": "$user_id", "key": _rollup_key_expression(period)},
+                "hours": {"$sum": "$total_hours"},
+                "days": {"$sum": 1},
+                "office_days": {"$sum": {"$cond": [{"$eq": ["$work_location", "office"]}, 1, 0]}},
+                "home_days": {"$sum": {"$cond": [{"$eq": ["$work_location", "office"]}, 0, 1]}}
+            }},
+            {"$project": {
+                "_id": {"$concat": ["$_id.user_id", "|", period, "|", "$_id.key"]},
+                "user_id": "$_id.user_id",
+                "period": {"$literal": period},
+                "key": "$_id.key",
+                "hours": 1,
+                "days": 1,
+                "office_days": 1,
+                "home_days": 1,
+                "updated_at": {"$literal": now}
+            }},
+            {"$merge": {"into": "attendance_rollups", "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+        await db.attendance.aggregate(pipeline, allowDiskUse=True).to_list(None)
     
+    counts = await count_by_period(scope)
+    return {period: counts.get(period, 0) for period in ROLLUP_PERIODS}
+
+async def count_by_period(match: Dict) -> Dict[str, int]:
+    pipeline = [{"$match": match}, {"$group": {"_id": "$period", "count": {"$sum": 1}}}]
+    groups = await db.attendance_rollups.aggregate(pipeline).to_list(None)
+    return {group["_id"]: group["count"] for group in groups}
+
+def attendance_status(attendance: Optional[Dict]) -> Dict[str, Any]:
     if not attendance:
         return {"checked_in": False, "checked_out": False}
     
@@ -315,119 +1788,460 @@ async def get_today_attendance(current_user: User = Depends(get_current_user)):
         "total_hours": attendance.get("total_hours")
     }
 
+@api_router.get("/attendance/today")
+async def get_today_attendance(current_user: User = Depends(get_current_user)):
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    attendance = await db.attendance.find_one({"user_id": current_user.id, "date": today})
+    return attendance_status(attendance)
+
+# Attendance dates are stored as zero-padded YYYY-MM-DD strings and compared
+# lexicographically, so query bounds must use exactly that form
+def parse_query_date(value: str) -> str:
+    try:
+        normalized = date.fromisoformat(value).isoformat()
+    except ValueError:
+        normalized = None
+    if normalized != value:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    return normalized
+
+ATTENDANCE_EXPORT_FIELDS = [
+    "id", "user_id", "date", "check_in_time", "check_out_time", "work_location",
+    "is_in_office_radius", "office_id", "total_hours"
+]
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def stream_attendance_csv(cursor):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ATTENDANCE_EXPORT_FIELDS)
+    async for record in cursor:
+        writer.writerow(["" if record.get(f) is None else _export_value(record.get(f)) for f in ATTENDANCE_EXPORT_FIELDS])
+        if buffer.tell() >= 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+async def stream_attendance_ndjson(cursor):
+    chunk = []
+    async for record in cursor:
+        chunk.append(json.dumps({f: _export_value(record.get(f)) for f in ATTENDANCE_EXPORT_FIELDS}))
+        if len(chunk) >= 500:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+@api_router.get("/attendance/export")
+async def export_attendance(
+    start_date: str,
+    end_date: str,
+    user_id: Optional[str] = None,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can export attendance")
+    
+    start_date = parse_query_date(start_date)
+    end_date = parse_query_date(end_date)
+    
+    query = {"date": {"$gte": start_date, "$lte": end_date}}
+    if user_id:
+        query["user_id"] = user_id
+    projection = {"_id": 0, **{f: 1 for f in ATTENDANCE_EXPORT_FIELDS}}
+    cursor = db.attendance.find(query, projection).sort([("date", ASCENDING), ("user_id", ASCENDING)]).batch_size(batch_size)
+    
+    filename = f"attendance_{start_date}_{end_date}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "ndjson":
+        return StreamingResponse(stream_attendance_ndjson(cursor), media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(stream_attendance_csv(cursor), media_type="text/csv", headers=headers)
+
 # User Routes
 @api_router.get("/users", response_model=List[User])
-async def get_users(current_user: User = Depends(get_current_user)):
+async def get_users(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can view users")
     
-    users = await db.users.find().to_list(1000)
-    return [User(**user) for user in users]
+    not_modified, headers = await conditional_get(request, "users", f"{limit}:{cursor}")
+    if not_modified:
+        return not_modified
+    users, next_cursor = await paginate(db.users, {}, USER_SORT, limit, cursor, model_projection(User))
+    return list_response(User, users, next_cursor, headers)
+
+@api_router.patch("/users/{user_id}", response_model=User)
+async def update_user(user_id: str, user_data: UserUpdate, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can update users")
+    
+    updates = {k: v for k, v in user_data.dict().items() if v is not None}
+    if "role" in updates and updates["role"] not in ("employee", "admin"):
+        raise HTTPException(status_code=400, detail="Role must be employee or admin")
+    updates["updated_at"] = datetime.now(timezone.utc)
+    
+    # Role and active state are carried in the token claims, so changing
+    # either revokes the user's outstanding tokens
+    update = {"$set": updates}
+    if "role" in updates or "is_active" in updates:
+        update["$inc"] = {"token_version": 1}
+        updates["revoked_at"] = updates["updated_at"]
+    user = await db.users.find_one_and_update(
+        {"id": user_id},
+        update,
+        return_document=ReturnDocument.AFTER
+    )
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user_cache.invalidate(user["username"])
+    token_revocations.bump(user["username"], user.get("token_version", 0), user.get("is_active", True))
+    await bump_collection_version("users")
+    return User(**user)
+
+@api_router.get("/admin/user-cache")
+async def get_user_cache_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view cache stats")
+    return user_cache.stats()
+
+@api_router.get("/admin/password-hasher")
+async def get_password_hasher_stats(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view hasher stats")
+    return password_hasher.stats()
 
 # Task Routes
 @api_router.post("/tasks", response_model=Task)
-async def create_task(task_data: TaskCreate, current_user: User = Depends(get_current_user)):
+async def create_task(task_data: TaskCreate, response: Response, current_user: User = Depends(get_current_user)):
     task_dict = task_data.dict()
     task_dict["created_by"] = current_user.id
     task = Task(**task_dict)
     
     await db.tasks.insert_one(task.dict())
+    await bump_collection_version("tasks")
+    await event_bus.publish(*task_event("task.created", task.dict()))
+    response.headers["ETag"] = task_etag(task.version)
     return task
 
+@api_router.post("/tasks/bulk")
+async def create_tasks_bulk(items: List[Dict], current_user: User = Depends(get_current_user)):
+    if len(items) > MAX_BULK_TASKS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_TASKS} tasks per request")
+    
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, TaskCreate(**item)))
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "error", "error": e.errors(include_url=False)}
+    
+    assignees = {task_data.assigned_to for _, task_data in valid}
+    known = set()
+    if assignees:
+        users = await db.users.find({"id": {"$in": list(assignees)}}, {"_id": 0, "id": 1}).to_list(None)
+        known = {user["id"] for user in users}
+    
+    to_insert = []
+    for index, task_data in valid:
+        if task_data.assigned_to not in known:
+            results[index] = {"index": index, "status": "error", "error": "Assigned user not found"}
+            continue
+        task_dict = task_data.dict()
+        task_dict["created_by"] = current_user.id
+        to_insert.append((index, Task(**task_dict)))
+    
+    failed = {}
+    if to_insert:
+        try:
+            await db.tasks.insert_many([task.dict() for _, task in to_insert], ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+        await bump_collection_version("tasks")
+    
+    for position, (index, task) in enumerate(to_insert):
+        if position in failed:
+            results[index] = {"index": index, "status": "error", "error": failed[position]}
+        else:
+            results[index] = {"index": index, "status": "created", "id": task.id}
+            await event_bus.publish(*task_event("task.created", task.dict()))
+    
+    created = sum(1 for result in results if result["status"] == "created")
+    return {"created": created, "failed": len(items) - created, "results": results}
+
 @api_router.get("/tasks", response_model=List[Task])
-async def get_tasks(current_user: User = Depends(get_current_user)):
-    if current_user.role == "admin":
-        tasks = await db.tasks.find().to_list(1000)
-    else:
-        tasks = await db.tasks.find({"assigned_to": current_user.id}).to_list(1000)
+async def get_tasks(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    not_modified, headers = await conditional_get(request, "tasks", f"{current_user.id}:{current_user.role}:{limit}:{cursor}")
+    if not_modified:
+        return not_modified
+    
+    query = {} if current_user.role == "admin" else {"assigned_to": current_user.id}
+    tasks, next_cursor = await paginate(db.tasks, query, TASK_SORT, limit, cursor, model_projection(Task))
     
-    return [Task(**task) for task in tasks]
+    return list_response(Task, tasks, next_cursor, headers)
 
-@api_router.patch("/tasks/{task_id}/status")
-async def update_task_status(task_id: str, status_data: Dict, current_user: User = Depends(get_current_user)):
-    task = await db.tasks.find_one({"id": task_id})
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
+# Task responses carry a strong ETag of the task version ("3"); If-Match must
+# echo one back. List ETags (W/"...") and other tags never match a task.
+def task_etag(version: int) -> str:
+    return f'"{version}"'
+
+def expected_task_version(body: Dict, if_match: Optional[str]) -> Optional[int]:
+    if "version" in body:
+        try:
+            return int(body["version"])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid task version")
+    if not if_match or if_match.strip() == "*":
+        return None
+    tag = if_match.strip()
+    if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+        return int(tag[1:-1])
+    raise HTTPException(status_code=412, detail="If-Match must be a task ETag")
+
+# Ownership and version checks live in the update filter so the common case is
+# one round trip; the task is only read back to explain why nothing matched.
+async def update_task_fields(task_id: str, updates: Dict, current_user: User, expected_version: Optional[int]) -> int:
+    query = {"id": task_id}
+    if current_user.role != "admin":
+        query["assigned_to"] = current_user.id
+    if expected_version is not None:
+        query["version"] = expected_version if expected_version else {"$in": [0, None]}
     
-    if task["assigned_to"] != current_user.id and current_user.role != "admin":
-        raise HTTPException(status_code=403, detail="Not authorized to update this task")
+    task = await db.tasks.find_one_and_update(
+        query,
+        {"$set": {**updates, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}},
+        projection={"_id": 0, **{f: 1 for f in TASK_EVENT_FIELDS}},
+        return_document=ReturnDocument.AFTER
+    )
+    if task is not None:
+        await bump_collection_version("tasks")
+        await event_bus.publish(*task_event("task.updated", task))
+        return task["version"]
     
-    await db.tasks.update_one(
-        {"id": task_id},
-        {"$set": {"status": status_data["status"], "updated_at": datetime.now(timezone.utc)}}
+    existing = await db.tasks.find_one({"id": task_id}, {"_id": 0, "assigned_to": 1, "version": 1})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Task not found")
+    if existing["assigned_to"] != current_user.id and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to update this task")
+    raise HTTPException(
+        status_code=409,
+        detail={"message": "Task was modified by someone else", "version": existing.get("version", 0)}
     )
-    return {"message": "Task status updated"}
+
+@api_router.patch("/tasks/{task_id}/status")
+async def update_task_status(
+    task_id: str,
+    status_data: Dict,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    version = await update_task_fields(
+        task_id,
+        {"status": status_data["status"]},
+        current_user,
+        expected_task_version(status_data, if_match)
+    )
+    response.headers["ETag"] = task_etag(version)
+    return {"message": "Task status updated", "version": version}
 
 @api_router.patch("/tasks/{task_id}/time")
-async def log_task_time(task_id: str, time_data: Dict, current_user: User = Depends(get_current_user)):
-    task = await db.tasks.find_one({"id": task_id})
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-    
-    if task["assigned_to"] != current_user.id and current_user.role != "admin":
-        raise HTTPException(status_code=403, detail="Not authorized to update this task")
-    
-    await db.tasks.update_one(
-        {"id": task_id},
-        {"$set": {"actual_hours": time_data["actual_hours"], "updated_at": datetime.now(timezone.utc)}}
+async def log_task_time(
+    task_id: str,
+    time_data: Dict,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user)
+):
+    version = await update_task_fields(
+        task_id,
+        {"actual_hours": time_data["actual_hours"]},
+        current_user,
+        expected_task_version(time_data, if_match)
     )
-    return {"message": "Task time logged"}
+    response.headers["ETag"] = task_etag(version)
+    return {"message": "Task time logged", "version": version}
 
 # Leave Routes
+ACTIVE_LEAVE_STATUSES = ("pending", "approved")
+MAX_CALENDAR_DAYS = 366
+
+# Dates without an offset are taken as UTC so start/end always compare
+def parse_leave_date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
 @api_router.post("/leaves", response_model=LeaveRequest)
 async def create_leave_request(leave_data: Dict, current_user: User = Depends(get_current_user)):
     # Check if leave is at least 5 days in advance
-    start_date = datetime.fromisoformat(leave_data["start_date"].replace('Z', '+00:00'))
+    start_date = parse_leave_date(leave_data["start_date"])
     days_difference = (start_date.date() - datetime.now(timezone.utc).date()).days
     
     if days_difference < 5:
         raise HTTPException(status_code=400, detail="Leave must be applied at least 5 days in advance")
     
+    end_date = parse_leave_date(leave_data["end_date"])
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="Leave end date must not be before its start date")
+    
+    overlapping = await db.leaves.find_one(
+        {
+            "user_id": current_user.id,
+            "status": {"$in": list(ACTIVE_LEAVE_STATUSES)},
+            "start_date": {"$lte": end_date},
+            "end_date": {"$gte": start_date}
+        },
+        {"_id": 0, "id": 1, "status": 1}
+    )
+    if overlapping:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Leave overlaps an existing {overlapping['status']} leave request ({overlapping['id']})"
+        )
+    
     leave_request = LeaveRequest(
         user_id=current_user.id,
         start_date=start_date,
-        end_date=datetime.fromisoformat(leave_data["end_date"].replace('Z', '+00:00')),
+        end_date=end_date,
         reason=leave_data["reason"],
         leave_type=leave_data.get("leave_type", "casual")
     )
     
     await db.leaves.insert_one(leave_request.dict())
+    await bump_collection_version("leaves")
+    await event_bus.publish(*leave_event("leave.created", leave_request.dict()))
     return leave_request
 
 @api_router.get("/leaves", response_model=List[LeaveRequest])
-async def get_leave_requests(current_user: User = Depends(get_current_user)):
-    if current_user.role == "admin":
-        leaves = await db.leaves.find().to_list(1000)
-    else:
-        leaves = await db.leaves.find({"user_id": current_user.id}).to_list(1000)
+async def get_leave_requests(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    not_modified, headers = await conditional_get(request, "leaves", f"{current_user.id}:{current_user.role}:{limit}:{cursor}")
+    if not_modified:
+        return not_modified
+    
+    query = {} if current_user.role == "admin" else {"user_id": current_user.id}
+    leaves, next_cursor = await paginate(db.leaves, query, LEAVE_SORT, limit, cursor, model_projection(LeaveRequest))
     
-    return [LeaveRequest(**leave) for leave in leaves]
+    return list_response(LeaveRequest, leaves, next_cursor, headers)
+
+# Interval overlap on the status_start_end index: a leave [start, end] is
+# in the window when it starts before the window ends and ends after it starts.
+# Employees see who is out on approved leave, without leave types.
+@api_router.get("/leaves/calendar")
+async def get_leave_calendar(
+    from_date: str = Query(..., alias="from"),
+    to_date: str = Query(..., alias="to"),
+    include_pending: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        window_start = datetime.strptime(from_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        window_end = datetime.strptime(to_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if window_end < window_start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (window_end - window_start).days >= MAX_CALENDAR_DAYS:
+        raise HTTPException(status_code=400, detail=f"Calendar range is limited to {MAX_CALENDAR_DAYS} days")
+    is_admin = current_user.role == "admin"
+    if include_pending and not is_admin:
+        raise HTTPException(status_code=403, detail="Only admins can view pending leaves")
+    
+    statuses = list(ACTIVE_LEAVE_STATUSES) if include_pending else ["approved"]
+    leaves = await db.leaves.find(
+        {
+            "status": {"$in": statuses},
+            "start_date": {"$lt": window_end + timedelta(days=1)},
+            "end_date": {"$gte": window_start}
+        },
+        {"_id": 0, "user_id": 1, "start_date": 1, "end_date": 1, "status": 1, "leave_type": 1}
+    ).to_list(None)
+    
+    days: Dict[str, List[Dict[str, str]]] = {}
+    for leave in leaves:
+        day = max(leave["start_date"].date(), window_start.date())
+        last_day = min(leave["end_date"].date(), window_end.date())
+        while day <= last_day:
+            entry = {"user_id": leave["user_id"]}
+            if is_admin:
+                entry.update(leave_type=leave.get("leave_type", "casual"), status=leave["status"])
+            days.setdefault(day.isoformat(), []).append(entry)
+            day += timedelta(days=1)
+    
+    user_ids = list({leave["user_id"] for leave in leaves})
+    users = await db.users.find(
+        {"id": {"$in": user_ids}}, {"_id": 0, "id": 1, "username": 1, "full_name": 1}
+    ).to_list(None) if user_ids else []
+    
+    return {
+        "from": from_date,
+        "to": to_date,
+        "days": dict(sorted(days.items())),
+        "users": {user["id"]: {"username": user["username"], "full_name": user["full_name"]} for user in users}
+    }
 
 @api_router.get("/leaves/pending", response_model=List[LeaveRequest])
-async def get_pending_leaves(current_user: User = Depends(get_current_user)):
+async def get_pending_leaves(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can view pending leaves")
     
-    leaves = await db.leaves.find({"status": "pending"}).to_list(1000)
-    return [LeaveRequest(**leave) for leave in leaves]
+    not_modified, headers = await conditional_get(request, "leaves", f"pending:{limit}:{cursor}")
+    if not_modified:
+        return not_modified
+    leaves, next_cursor = await paginate(
+        db.leaves, {"status": "pending"}, PENDING_LEAVE_SORT, limit, cursor, model_projection(LeaveRequest)
+    )
+    return list_response(LeaveRequest, leaves, next_cursor, headers)
 
 @api_router.patch("/leaves/{leave_id}/approve")
 async def approve_leave(leave_id: str, current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can approve leaves")
     
-    result = await db.leaves.update_one(
+    leave = await db.leaves.find_one_and_update(
         {"id": leave_id},
         {"$set": {
             "status": "approved",
             "approved_by": current_user.id,
             "updated_at": datetime.now(timezone.utc)
-        }}
+        }},
+        projection={"_id": 0, **{f: 1 for f in LEAVE_EVENT_FIELDS}},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.modified_count == 0:
+    if leave is None:
         raise HTTPException(status_code=404, detail="Leave request not found")
     
+    await bump_collection_version("leaves")
+    await event_bus.publish(*leave_event("leave.updated", leave))
     return {"message": "Leave request approved"}
 
 @api_router.patch("/leaves/{leave_id}/reject")
@@ -435,24 +2249,541 @@ async def reject_leave(leave_id: str, current_user: User = Depends(get_current_u
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can reject leaves")
     
-    result = await db.leaves.update_one(
+    leave = await db.leaves.find_one_and_update(
         {"id": leave_id},
         {"$set": {
             "status": "rejected",
             "approved_by": current_user.id,
             "updated_at": datetime.now(timezone.utc)
-        }}
+        }},
+        projection={"_id": 0, **{f: 1 for f in LEAVE_EVENT_FIELDS}},
+        return_document=ReturnDocument.AFTER
     )
     
-    if result.modified_count == 0:
+    if leave is None:
         raise HTTPException(status_code=404, detail="Leave request not found")
     
+    await bump_collection_version("leaves")
+    await event_bus.publish(*leave_event("leave.updated", leave))
     return {"message": "Leave request rejected"}
 
+@api_router.post("/leaves/bulk-decision")
+async def decide_leaves_bulk(decision_data: BulkLeaveDecision, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can approve or reject leaves")
+    if decision_data.decision not in ("approved", "rejected"):
+        raise HTTPException(status_code=400, detail="Decision must be approved or rejected")
+    
+    leave_ids = list(dict.fromkeys(decision_data.leave_ids))
+    if len(leave_ids) > MAX_BULK_LEAVE_DECISIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_LEAVE_DECISIONS} leaves per request")
+    
+    # Tag the documents this call changes so they can be told apart from
+    # leaves that were already decided
+    batch_id = str(uuid.uuid4())
+    result = await db.leaves.update_many(
+        {"id": {"$in": leave_ids}, "status": "pending"},
+        {"$set": {
+            "status": decision_data.decision,
+            "approved_by": current_user.id,
+            "decision_batch": batch_id,
+            "updated_at": datetime.now(timezone.utc)
+        }}
+    )
+    if result.modified_count:
+        await bump_collection_version("leaves")
+    
+    leaves = await db.leaves.find(
+        {"id": {"$in": leave_ids}}, {"_id": 0, "decision_batch": 1, **{f: 1 for f in LEAVE_EVENT_FIELDS}}
+    ).to_list(None)
+    found = {leave["id"]: leave for leave in leaves}
+    updated = [leave_id for leave_id in leave_ids if found.get(leave_id, {}).get("decision_batch") == batch_id]
+    already_decided = [
+        {"id": leave_id, "status": found[leave_id]["status"]}
+        for leave_id in leave_ids if leave_id in found and found[leave_id].get("decision_batch") != batch_id
+    ]
+    not_found = [leave_id for leave_id in leave_ids if leave_id not in found]
+    for leave_id in updated:
+        await event_bus.publish(*leave_event("leave.updated", found[leave_id]))
+    
+    return {
+        "decision": decision_data.decision,
+        "modified_count": result.modified_count,
+        "updated": updated,
+        "already_decided": already_decided,
+        "not_found": not_found
+    }
+
+# Event Routes
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def format_sse(event: Dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=_json_default)}\n\n"
+
+# Subscribes only once the response starts streaming, so a client that
+# disconnects before then never leaves a queue behind
+async def stream_events(request: Request, topics: List[str]):
+    queue = event_bus.subscribe(topics)
+    try:
+        yield ": connected\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=EVENT_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        event_bus.unsubscribe(queue, topics)
+
+# EventSource cannot send headers, and query strings end up in access logs,
+# so ?token= only accepts a short-lived token scoped to the event stream
+@api_router.post("/events/token")
+async def create_event_stream_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    await authenticate_token(credentials.credentials)
+    claims = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    claims.update(
+        scope="events",
+        exp=datetime.now(timezone.utc) + timedelta(seconds=EVENT_STREAM_TOKEN_SECONDS)
+    )
+    return {
+        "stream_token": jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALGORITHM),
+        "expires_in": EVENT_STREAM_TOKEN_SECONDS
+    }
+
+@api_router.get("/events/stream")
+async def get_event_stream(request: Request, token: Optional[str] = None):
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        current_user = await authenticate_token(authorization[7:])
+    elif token:
+        current_user = await authenticate_token(token, scope="events")
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    topics = [f"user:{current_user.id}"]
+    if current_user.role == "admin":
+        topics.append(ADMIN_TOPIC)
+    return StreamingResponse(
+        stream_events(request, topics),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Report Routes
+REPORT_GROUP_KEYS = {
+    "day": "$date",
+    "week": _rollup_key_expression("week"),
+    "user": "$user_id",
+    "work_location": "$work_location",
+}
+
+# Reports over periods that ended before today cannot change, so they are
+# cached per (query, day); open periods are always recomputed.
+class ReportCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+report_cache = ReportCache(REPORT_CACHE_MAX_SIZE)
+
+def late_minutes_threshold() -> int:
+    hours, minutes = LATE_CHECK_IN_TIME.split(":")
+    return int(hours) * 60 + int(minutes)
+
+async def aggregate_attendance_report(start_date: str, end_date: str, user_id: Optional[str], group_by: str) -> List[Dict]:
+    match = {"date": {"$gte": start_date, "$lte": end_date}}
+    if user_id:
+        match["user_id"] = user_id
+    check_in = {"$toDate": "$check_in_time"}
+    check_in_minutes = {"$add": [{"$multiply": [{"$hour": check_in}, 60]}, {"$minute": check_in}]}
+    
+    pipeline = [{"$match": match}]
+    if group_by == "week":
+        pipeline.append({"$addFields": {"_day": {"$dateFromString": {"dateString": "$date", "format": "%Y-%m-%d"}}}})
+    pipeline += [
+        {"$group": {
+            "_id": REPORT_GROUP_KEYS[group_by],
+            "records": {"$sum": 1},
+            "users": {"$addToSet": "$user_id"},
+            "total_hours": {"$sum": "$total_hours"},
+            "office_days": {"$sum": {"$cond": [{"$eq": ["$work_location", "office"]}, 1, 0]}},
+            "late_check_ins": {"$sum": {"$cond": [
+                {"$and": [{"$ne": ["$check_in_time", None]}, {"$gt": [check_in_minutes, late_minutes_threshold()]}]}, 1, 0
+            ]}}
+        }},
+        {"$project": {
+            "_id": 0,
+            group_by: "$_id",
+            "records": 1,
+            "users": {"$size": "$users"},
+            "total_hours": {"$round": ["$total_hours", 2]},
+            "office_days": 1,
+            "in_office_ratio": {"$round": [{"$divide": ["$office_days", "$records"]}, 4]},
+            "late_check_ins": 1
+        }},
+        {"$sort": {group_by: 1}}
+    ]
+    return await db.attendance.aggregate(pipeline, allowDiskUse=True).to_list(None)
+
+@api_router.get("/reports/attendance")
+async def get_attendance_report(
+    start_date: str,
+    end_date: str,
+    user_id: Optional[str] = None,
+    group_by: str = Query("day", pattern="^(day|week|user|work_location)$"),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        if user_id and user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Only admins can view other users' reports")
+        user_id = current_user.id
+    
+    start_date = parse_query_date(start_date)
+    end_date = parse_query_date(end_date)
+    
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    closed = end_date < today
+    cache_key = (start_date, end_date, user_id, group_by, today)
+    groups = report_cache.get(cache_key) if closed else None
+    cached = groups is not None
+    if groups is None:
+        groups = await aggregate_attendance_report(start_date, end_date, user_id, group_by)
+        if closed:
+            report_cache.put(cache_key, groups)
+    
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "user_id": user_id,
+        "group_by": group_by,
+        "cached": cached,
+        "groups": groups
+    }
+
+@api_router.get("/reports/rollups")
+async def get_attendance_rollups(
+    period: str = Query("month", pattern="^(day|week|month)$"),
+    user_id: Optional[str] = None,
+    from_key: Optional[str] = None,
+    to_key: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        if user_id and user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Only admins can view other users' reports")
+        user_id = current_user.id
+    
+    query = {"period": period}
+    if user_id:
+        query["user_id"] = user_id
+    if from_key or to_key:
+        query["key"] = {}
+        if from_key:
+            query["key"]["$gte"] = from_key
+        if to_key:
+            query["key"]["$lte"] = to_key
+    
+    rollups = await db.attendance_rollups.find(query, {"_id": 0}).sort(
+        [("user_id", ASCENDING), ("key", ASCENDING)]
+    ).to_list(None)
+    for rollup in rollups:
+        rollup["hours"] = round(rollup.get("hours", 0.0), 2)
+    return rollups
+
+@api_router.post("/admin/rollups/rebuild")
+async def rebuild_rollups(user_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can rebuild rollups")
+    counts = await rebuild_attendance_rollups(user_id)
+    return {"message": "Attendance rollups rebuilt", "rollups": counts}
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(
+    collection_scans_only: bool = False,
+    limit: int = Query(50, ge=1, le=SLOW_QUERY_MAX_SHAPES),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can view slow queries")
+    shapes = slow_command_monitor.snapshot()
+    if collection_scans_only:
+        shapes = [shape for shape in shapes if shape["collection_scan"]]
+    return {
+        "enabled": slow_command_monitor.enabled,
+        "threshold_ms": slow_command_monitor.threshold_ms,
+        "shapes": shapes[:limit],
+    }
+
+@api_router.delete("/admin/slow-queries")
+async def clear_slow_queries(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can clear slow queries")
+    slow_command_monitor.clear()
+    return {"message": "Slow query log cleared"}
+
+# Metrics Routes
+@api_router.get("/metrics")
+async def get_metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    
+    lines = route_metrics.render() + mongo_command_metrics.render()
+    gauges = {
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "event_bus": event_bus.stats(),
+        "mongo_pool": mongo_pool_monitor.stats(),
+        "login_throttle": login_throttle.stats(),
+    }
+    for component, stats in gauges.items():
+        for name, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines.append(f"app_{component}_{name} {value}")
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# Health Routes
+@api_router.get("/health/ready")
+async def readiness_probe():
+    pool = mongo_pool_monitor.stats()
+    try:
+        await asyncio.wait_for(client.admin.command("ping"), timeout=MONGO_SERVER_SELECTION_TIMEOUT_MS / 1000)
+    except (PyMongoError, asyncio.TimeoutError) as e:
+        return ORJSONResponse({"status": "unavailable", "error": str(e) or "ping timed out", "pool": pool}, status_code=503)
+    if not pool["warmed_up"]:
+        return ORJSONResponse({"status": "warming_up", "pool": pool}, status_code=503)
+    return ORJSONResponse({"status": "ready", "pool": pool})
+
+# Dashboard Routes
+async def count_by_status(collection, match: Dict) -> Dict[str, int]:
+    pipeline = [{"$match": match}, {"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+    groups = await collection.aggregate(pipeline).to_list(None)
+    return {group["_id"]: group["count"] for group in groups}
+
+@api_router.get("/dashboard/summary")
+async def get_dashboard_summary(current_user: User = Depends(get_current_user)):
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    is_admin = current_user.role == "admin"
+    task_match = {} if is_admin else {"assigned_to": current_user.id}
+    leave_match = {} if is_admin else {"user_id": current_user.id}
+    
+    queries = [
+        db.attendance.find_one(
+            {"user_id": current_user.id, "date": today},
+            {"_id": 0, "check_in_time": 1, "check_out_time": 1, "work_location": 1, "total_hours": 1}
+        ),
+        count_by_status(db.tasks, task_match),
+        count_by_status(db.leaves, leave_match),
+    ]
+    if is_admin:
+        queries += [
+            db.users.count_documents({"is_active": True}),
+            db.attendance.count_documents({"date": today, "check_in_time": {"$ne": None}}),
+        ]
+    results = await asyncio.gather(*queries)
+    attendance, task_counts, leave_counts = results[:3]
+    
+    summary = {
+        "user": {
+            "id": current_user.id,
+            "username": current_user.username,
+            "full_name": current_user.full_name,
+            "role": current_user.role
+        },
+        "attendance": attendance_status(attendance),
+        "tasks": {"total": sum(task_counts.values()), "by_status": task_counts},
+        "leaves": {"total": sum(leave_counts.values()), "by_status": leave_counts},
+    }
+    if is_admin:
+        summary["admin"] = {
+            "pending_leaves": leave_counts.get("pending", 0),
+            "active_users": results[3],
+            "checked_in_today": results[4]
+        }
+    return summary
+
+# Indexes backing the hot lookups above: (collection, keys, options)
+INDEX_SPECS = [
+    ("users", [("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+    ("users", [("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+    ("users", [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    ("users", [("revoked_at", ASCENDING)], {"name": "revoked_at", "sparse": True}),
+    ("attendance", [("user_id", ASCENDING), ("date", ASCENDING)], {"name": "user_date_unique", "unique": True}),
+    ("attendance", [("date", ASCENDING), ("user_id", ASCENDING)], {"name": "date_user"}),
+    ("tasks", [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    ("tasks", [("assigned_to", ASCENDING), ("due_date", ASCENDING), ("id", ASCENDING)], {"name": "assigned_to_due_date_id"}),
+    ("tasks", [("due_date", ASCENDING), ("id", ASCENDING)], {"name": "due_date_id"}),
+    ("attendance_rollups", [("period", ASCENDING), ("user_id", ASCENDING), ("key", ASCENDING)], {"name": "period_user_key"}),
+    ("leaves", [("id", ASCENDING)], {"name": "id_unique", "unique": True}),
+    ("leaves", [("status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], {"name": "status_created_at_id"}),
+    ("leaves", [("user_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], {"name": "user_created_at_id"}),
+    ("leaves", [("created_at", ASCENDING), ("id", ASCENDING)], {"name": "created_at_id"}),
+    ("leaves", [("status", ASCENDING), ("start_date", ASCENDING), ("end_date", ASCENDING)], {"name": "status_start_end"}),
+    ("rate_limits", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+]
+
+# Stable keyset sort orders for the paginated list endpoints, each backed by an index above
+USER_SORT = [("username", ASCENDING)]
+TASK_SORT = [("due_date", ASCENDING), ("id", ASCENDING)]
+LEAVE_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+PENDING_LEAVE_SORT = [("created_at", ASCENDING), ("id", ASCENDING)]
+
+# Set at startup; check_in only relies on the upsert alone when the unique
+# (user_id, date) index is known to exist
+attendance_unique_index = False
+
+# Duplicate (user_id, date) rows predate the unique index and block building
+# it. Keeps one row per day (a checked-out one if any, else the earliest
+# check-in), deletes the rest and rebuilds the affected users' rollups. Run
+# explicitly via manage.py dedupe-attendance; dry_run only reports.
+async def dedupe_attendance(dry_run: bool = False) -> Dict[str, int]:
+    pipeline = [
+        # Legacy rows store check_in_time as an ISO string, so normalize it
+        # before sorting; rows without a usable check-in sort last
+        {"$project": {
+            "user_id": 1,
+            "date": 1,
+            "open": {"$eq": [{"$ifNull": ["$check_out_time", None]}, None]},
+            "check_in": {"$convert": {
+                "input": "$check_in_time", "to": "date", "onError": datetime.max, "onNull": datetime.max
+            }}
+        }},
+        {"$sort": {"user_id": 1, "date": 1, "open": 1, "check_in": 1, "_id": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "date": "$date"},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    removed = []
+    affected_users = set()
+    async for group in db.attendance.aggregate(pipeline, allowDiskUse=True):
+        removed.extend(group["ids"][1:])
+        affected_users.add(group["_id"]["user_id"])
+    counts = {"rows": len(removed), "users": len(affected_users)}
+    if dry_run or not removed:
+        return counts
+    
+    await db.attendance.delete_many({"_id": {"$in": removed}})
+    for user_id in affected_users:
+        await rebuild_attendance_rollups(user_id)
+    logger.warning(f"Removed {len(removed)} duplicate attendance rows for {len(affected_users)} users")
+    return counts
+
+async def ensure_indexes():
+    attendance_indexes = await db.attendance.index_information()
+    if "user_date_unique" not in attendance_indexes:
+        logger.warning(
+            "attendance.user_date_unique is missing; check-in keeps its read-first guard until it is built. "
+            "If duplicate rows block it, run manage.py dedupe-attendance"
+        )
+    for collection, keys, options in INDEX_SPECS:
+        try:
+            await db[collection].create_index(keys, **options)
+        except OperationFailure as e:
+            logger.error(f"Could not create index {collection}.{options['name']}: {e}")
+
+async def verify_indexes():
+    problems = []
+    existing = {}
+    for collection, keys, options in INDEX_SPECS:
+        if collection not in existing:
+            existing[collection] = await db[collection].index_information()
+        info = existing[collection].get(options["name"])
+        if info is None:
+            problems.append(f"{collection}.{options['name']}: missing")
+            continue
+        actual_keys = [(field, int(direction)) for field, direction in info["key"]]
+        if actual_keys != keys:
+            problems.append(f"{collection}.{options['name']}: expected keys {keys}, found {actual_keys}")
+        if bool(info.get("unique")) != options.get("unique", False):
+            problems.append(f"{collection}.{options['name']}: expected unique={options.get('unique', False)}")
+    return problems
+
+@app.on_event("startup")
+async def warm_up_mongo():
+    if SERVERLESS:
+        return
+    try:
+        await warm_up_mongo_client(client)
+        logger.info(f"MongoDB pool warmed up in {mongo_pool_monitor.warmup_seconds}s")
+    except (PyMongoError, asyncio.TimeoutError) as e:
+        logger.error(f"MongoDB warm-up failed, retrying in the background: {e}")
+        start_mongo_retry()
+
+@app.on_event("startup")
+async def start_event_bus():
+    await event_bus.start(EVENT_BUS_BACKEND)
+
+@app.on_event("startup")
+async def start_token_revocations():
+    # Serverless containers are frozen between invocations, so the snapshot is
+    # refreshed on demand by authenticate_token instead of a background loop
+    if SERVERLESS:
+        return
+    # An unreachable MongoDB must not block startup; the loop keeps retrying
+    try:
+        await token_revocations.refresh()
+    except PyMongoError as e:
+        logger.error(f"Token revocation refresh failed at startup: {e}")
+    token_revocations.start()
+
+@app.on_event("startup")
+async def start_slow_command_monitor():
+    slow_command_monitor.start(asyncio.get_running_loop(), client)
+
+@app.on_event("startup")
+async def create_indexes():
+    global attendance_unique_index
+    if SERVERLESS:
+        # Indexes are bootstrapped at deploy time (manage.py bootstrap); only
+        # the index check_in depends on is confirmed here. Until it is,
+        # check_in keeps its read-first guard
+        try:
+            attendance_unique_index = "user_date_unique" in await db.attendance.index_information()
+        except PyMongoError as e:
+            logger.error(f"Could not check attendance indexes: {e}")
+        return
+    await run_or_defer(bootstrap_indexes)
+
+async def bootstrap_indexes():
+    global attendance_unique_index
+    await ensure_indexes()
+    problems = await verify_indexes()
+    attendance_unique_index = not any(problem.startswith("attendance.user_date_unique") for problem in problems)
+    for problem in problems:
+        logger.warning(f"Index check failed - {problem}")
+    if not problems:
+        logger.info(f"Verified {len(INDEX_SPECS)} indexes")
+    return problems
+
 # Create default admin user
 @app.on_event("startup")
 async def create_default_admin():
-    admin_exists = await db.users.find_one({"role": "admin"})
+    if SERVERLESS:
+        return
+    await run_or_defer(ensure_default_admin)
+
+async def ensure_default_admin():
+    admin_exists = await db.users.find_one({"role": "admin"}, {"_id": 1})
     if not admin_exists:
         admin_user = {
             "id": str(uuid.uuid4()),
@@ -461,7 +2792,7 @@ async def create_default_admin():
             "full_name": "System Administrator",
             "role": "admin",
             "is_active": True,
-            "hashed_password": get_password_hash("admin123"),
+            "hashed_password": await password_hasher.hash("admin123"),
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc)
         }
@@ -477,7 +2808,9 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -490,4 +2823,25 @@ logger = logging.getLogger(__name__)
 async def shutdown_db_client():
     client.close()
 
+@app.on_event("shutdown")
+async def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+@app.on_event("shutdown")
+async def stop_token_revocations():
+    token_revocations.stop()
+
+@app.on_event("shutdown")
+async def stop_mongo_warm_up():
+    if mongo_warmup_task is not None:
+        mongo_warmup_task.cancel()
+
+@app.on_event("shutdown")
+async def stop_slow_command_monitor():
+    slow_command_monitor.stop()
+
+@app.on_event("shutdown")
+async def stop_event_bus():
+    await event_bus.stop()
+
 
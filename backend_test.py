@@ -139,6 +139,64 @@ https://github.com/Vanshmakhija16/Mindery
         )
         return success
 
+    def test_user_cache_stats(self):
+        """Test authenticated-user cache counters"""
+        success, response = self.run_test(
+            "User Cache Stats",
+            "GET",
+            "admin/user-cache",
+            200,
+            token=self.admin_token,
+            description="Get user cache hit/miss counters"
+        )
+        if success:
+            print(f"   Cache hits: {response.get('hits')}, misses: {response.get('misses')}")
+        return success
+
+    def test_health_ready(self):
+        """Test readiness probe"""
+        success, response = self.run_test(
+            "Readiness Probe",
+            "GET",
+            "health/ready",
+            200,
+            description="Check MongoDB reachability and pool warm-up"
+        )
+        if success:
+            pool = response.get('pool', {})
+            print(f"   Open connections: {pool.get('open')}, warm-up: {pool.get('warmup_seconds')}s")
+        return success
+
+    def test_leave_calendar(self):
+        """Test who-is-out leave calendar"""
+        start = datetime.now().strftime('%Y-%m-%d')
+        end = (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d')
+        success, response = self.run_test(
+            "Leave Calendar",
+            "GET",
+            f"leaves/calendar?from={start}&to={end}&include_pending=true",
+            200,
+            token=self.admin_token,
+            description="Get per-day map of users on leave"
+        )
+        if success:
+            print(f"   Days with absences: {len(response.get('days', {}))}, users: {len(response.get('users', {}))}")
+        return success
+
+    def test_slow_queries(self):
+        """Test slow MongoDB command log"""
+        success, response = self.run_test(
+            "Slow Queries",
+            "GET",
+            "admin/slow-queries",
+            200,
+            token=self.admin_token,
+            description="Get captured slow command shapes and plans"
+        )
+        if success:
+            print(f"   Enabled: {response.get('enabled')}, shapes: {len(response.get('shapes', []))}")
+        return success
+
     def test_create_office_location(self):
         """Test creating office location"""
         location_data = {
@@ -193,6 +251,46 @@ https://github.com/Vanshmakhija16/Mindery
         )
         return success
 
+    def test_repeat_check_in(self):
+        """Test a second check-in on the same day is rejected"""
+        success, response = self.run_test(
+            "Repeat Check-in",
+            "POST",
+            "attendance/check-in",
+            400,
+            data={"latitude": 40.7128, "longitude": -74.0060},
+            token=self.employee_token,
+            description="Second check-in without an idempotency key"
+        )
+        return success
+
+    def test_check_in_idempotency_replay(self):
+        """Test a retried check-in with the same Idempotency-Key returns the original response"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Check-in Idempotency Replay...")
+        url = f"{self.api_url}/attendance/check-in"
+        headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {self.admin_token}',
+            'Idempotency-Key': str(uuid.uuid4())
+        }
+        data = {"latitude": 40.7128, "longitude": -74.0060}
+        try:
+            first = requests.post(url, json=data, headers=headers, timeout=10)
+            replay = requests.post(url, json=data, headers=headers, timeout=10)
+            headers['Idempotency-Key'] = str(uuid.uuid4())
+            other_key = requests.post(url, json=data, headers=headers, timeout=10)
+            if (first.status_code == 200 and replay.status_code == 200 and replay.json() == first.json()
+                    and other_key.status_code == 400):
+                self.tests_passed += 1
+                print(f"✅ Passed - Replay returned the original response, a new key got 400")
+                return True
+            print(f"❌ Failed - Statuses: {first.status_code}, {replay.status_code}, {other_key.status_code}")
+            return False
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False
+
     def test_get_today_attendance(self):
         """Test getting today's attendance"""
         success, response = self.run_test(
@@ -224,6 +322,25 @@ https://github.com/Vanshmakhija16/Mindery
         )
         return success
 
+    def test_attendance_export(self):
+        """Test streaming attendance export"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        url = f"{self.api_url}/attendance/export?start_date={today}&end_date={today}&format=csv"
+        self.tests_run += 1
+        print(f"\n🔍 Testing Attendance Export...")
+        try:
+            response = requests.get(url, headers={'Authorization': f'Bearer {self.admin_token}'}, timeout=30)
+            lines = response.text.splitlines()
+            if response.status_code == 200 and lines and lines[0].startswith("id,user_id,date"):
+                self.tests_passed += 1
+                print(f"✅ Passed - {len(lines) - 1} rows exported")
+                return True
+            print(f"❌ Failed - Status: {response.status_code}")
+            return False
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False
+
     def test_create_task(self):
         """Test creating a task"""
         task_data = {
@@ -251,6 +368,37 @@ https://github.com/Vanshmakhija16/Mindery
         
         return success
 
+    def test_create_tasks_bulk(self):
+        """Test bulk task creation with per-item results"""
+        if not self.test_user_id:
+            print("❌ Skipping - No test user ID available")
+            return False
+
+        due_date = (datetime.now() + timedelta(days=7)).isoformat()
+        tasks = [{
+            "title": f"Bulk Task {i}",
+            "category": "Development",
+            "priority": "low",
+            "assigned_to": self.test_user_id,
+            "estimated_hours": 1.0,
+            "due_date": due_date
+        } for i in range(3)]
+        tasks.append({**tasks[0], "assigned_to": str(uuid.uuid4())})
+
+        success, response = self.run_test(
+            "Bulk Create Tasks",
+            "POST",
+            "tasks/bulk",
+            200,
+            data=tasks,
+            token=self.admin_token,
+            description="Create several tasks in one request, one with an unknown assignee"
+        )
+        if success:
+            print(f"   Created: {response.get('created')}, failed: {response.get('failed')}")
+            return response.get('created') == 3 and response.get('failed') == 1
+        return False
+
     def test_get_tasks(self):
         """Test getting tasks"""
         success, response = self.run_test(
@@ -274,6 +422,30 @@ https://github.com/Vanshmakhija16/Mindery
         
         return success and success2
 
+    def test_tasks_pagination(self):
+        """Test keyset pagination on tasks list"""
+        url = f"{self.api_url}/tasks?limit=1"
+        headers = {'Authorization': f'Bearer {self.admin_token}'}
+        self.tests_run += 1
+        print(f"\n🔍 Testing Tasks Pagination...")
+        try:
+            first = requests.get(url, headers=headers, timeout=10)
+            cursor = first.headers.get('X-Next-Cursor')
+            if first.status_code != 200 or len(first.json()) > 1:
+                print(f"❌ Failed - First page status {first.status_code}")
+                return False
+            if cursor:
+                second = requests.get(f"{url}&cursor={cursor}", headers=headers, timeout=10)
+                if second.status_code != 200 or (second.json() and second.json()[0]['id'] == first.json()[0]['id']):
+                    print(f"❌ Failed - Second page did not advance")
+                    return False
+            self.tests_passed += 1
+            print(f"✅ Passed - Next cursor present: {bool(cursor)}")
+            return True
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False
+
     def test_update_task_status(self):
         """Test updating task status"""
         if not self.test_task_id:
@@ -291,6 +463,83 @@ https://github.com/Vanshmakhija16/Mindery
         )
         return success
 
+    def test_task_update_errors(self):
+        """Test task update 404/403/409/412 distinctions and ETag round trip"""
+        if not self.test_task_id:
+            print("❌ Skipping task update errors - no task ID available")
+            return False
+
+        success, _ = self.run_test(
+            "Update Missing Task",
+            "PATCH",
+            f"tasks/{uuid.uuid4()}/status",
+            404,
+            data={"status": "completed"},
+            token=self.employee_token,
+            description="Updating an unknown task returns 404"
+        )
+
+        other_success, other_task = self.run_test(
+            "Create Task For Someone Else",
+            "POST",
+            "tasks",
+            200,
+            data={
+                "title": "Someone Else's Task",
+                "category": "Development",
+                "priority": "low",
+                "assigned_to": str(uuid.uuid4()),
+                "estimated_hours": 1.0,
+                "due_date": (datetime.now() + timedelta(days=7)).isoformat()
+            },
+            token=self.admin_token,
+            description="Admin creates a task not assigned to the employee"
+        )
+        if other_success:
+            success &= self.run_test(
+                "Update Unassigned Task",
+                "PATCH",
+                f"tasks/{other_task['id']}/status",
+                403,
+                data={"status": "completed"},
+                token=self.employee_token,
+                description="Employee cannot update a task assigned to someone else"
+            )[0]
+        else:
+            success = False
+
+        success &= self.run_test(
+            "Update Task With Stale Version",
+            "PATCH",
+            f"tasks/{self.test_task_id}/status",
+            409,
+            data={"status": "completed", "version": 9999},
+            token=self.employee_token,
+            description="Stale body version returns 409"
+        )[0]
+
+        self.tests_run += 1
+        print(f"\n🔍 Testing Task If-Match ETags...")
+        url = f"{self.api_url}/tasks/{self.test_task_id}/status"
+        headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {self.employee_token}'}
+        try:
+            current = requests.patch(url, json={"status": "in_progress"}, headers=headers, timeout=10)
+            etag = current.headers.get("ETag")
+            matched = requests.patch(url, json={"status": "in_progress"}, headers={**headers, "If-Match": etag}, timeout=10)
+            stale = requests.patch(url, json={"status": "in_progress"}, headers={**headers, "If-Match": etag}, timeout=10)
+            weak = requests.patch(url, json={"status": "in_progress"}, headers={**headers, "If-Match": 'W/"abc"'}, timeout=10)
+            statuses = (current.status_code, matched.status_code, stale.status_code, weak.status_code)
+            if statuses == (200, 200, 409, 412):
+                self.tests_passed += 1
+                print(f"✅ Passed - ETag {etag} matched once, then 409; list tag got 412")
+            else:
+                print(f"❌ Failed - Statuses: {statuses}")
+                success = False
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            success = False
+        return success
+
     def test_log_task_time(self):
         """Test logging task time"""
         if not self.test_task_id:
@@ -387,6 +636,72 @@ https://github.com/Vanshmakhija16/Mindery
         )
         return success
 
+    def test_bulk_leave_decision(self):
+        """Test bulk leave approval reporting"""
+        missing_id = str(uuid.uuid4())
+        leave_ids = [missing_id] + ([self.test_leave_id] if self.test_leave_id else [])
+        success, response = self.run_test(
+            "Bulk Leave Decision",
+            "POST",
+            "leaves/bulk-decision",
+            200,
+            data={"leave_ids": leave_ids, "decision": "approved"},
+            token=self.admin_token,
+            description="Approve a decided leave and an unknown id in one request"
+        )
+        if success:
+            print(f"   Updated: {len(response.get('updated', []))}, already decided: {len(response.get('already_decided', []))}, not found: {len(response.get('not_found', []))}")
+            return missing_id in response.get('not_found', [])
+        return False
+
+    def test_dashboard_summary(self):
+        """Test aggregated dashboard summary"""
+        success, response = self.run_test(
+            "Dashboard Summary",
+            "GET",
+            "dashboard/summary",
+            200,
+            token=self.admin_token,
+            description="Get attendance, task and leave counts in one call"
+        )
+        if success:
+            print(f"   Tasks: {response.get('tasks', {}).get('total')}, pending leaves: {response.get('admin', {}).get('pending_leaves')}")
+            return 'attendance' in response and 'tasks' in response and 'leaves' in response
+        return False
+
+    def test_attendance_report(self):
+        """Test attendance report aggregation"""
+        start = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        end = datetime.now().strftime('%Y-%m-%d')
+        success, response = self.run_test(
+            "Attendance Report",
+            "GET",
+            f"reports/attendance?start_date={start}&end_date={end}&group_by=user",
+            200,
+            token=self.admin_token,
+            description="Aggregate attendance per user for the last 30 days"
+        )
+        if success:
+            print(f"   Groups: {len(response.get('groups', []))}")
+            return 'groups' in response
+        return False
+
+    def test_metrics(self):
+        """Test Prometheus metrics endpoint"""
+        self.tests_run += 1
+        print(f"\n🔍 Testing Metrics Endpoint...")
+        try:
+            response = requests.get(f"{self.api_url}/metrics", timeout=10)
+            if response.status_code == 200 and "http_request_duration_seconds" in response.text:
+                self.tests_passed += 1
+                print(f"✅ Passed - {len(response.text.splitlines())} metric lines")
+                return True
+            print(f"❌ Failed - Status: {response.status_code}")
+            return False
+        except Exception as e:
+            print(f"❌ Failed - Error: {str(e)}")
+            return False
+
     def test_invalid_login(self):
         """Test login with invalid credentials"""
         success, response = self.run_test(
@@ -445,6 +760,7 @@ def main():
     tester.test_create_employee_user()
     tester.test_get_users()
     tester.test_employee_admin_access()
+    tester.test_user_cache_stats()
     
     # Office Location Tests
     print("\n🏢 OFFICE LOCATION TESTS")
@@ -456,16 +772,22 @@ def main():
     print("\n⏰ ATTENDANCE TESTS")
     print("-" * 30)
     tester.test_attendance_check_in()
+    tester.test_repeat_check_in()
+    tester.test_check_in_idempotency_replay()
     tester.test_get_today_attendance()
     tester.test_attendance_check_out()
+    tester.test_attendance_export()
     
     # Task Management Tests
     print("\n📝 TASK MANAGEMENT TESTS")
     print("-" * 30)
     tester.test_create_task()
+    tester.test_create_tasks_bulk()
     tester.test_get_tasks()
+    tester.test_tasks_pagination()
     tester.test_update_task_status()
     tester.test_log_task_time()
+    tester.test_task_update_errors()
     
     # Leave Management Tests
     print("\n🏖️ LEAVE MANAGEMENT TESTS")
@@ -474,6 +796,17 @@ def main():
     tester.test_get_leave_requests()
     tester.test_get_pending_leaves()
     tester.test_approve_leave()
+    tester.test_bulk_leave_decision()
+    tester.test_leave_calendar()
+    
+    # Dashboard Tests
+    print("\n📊 DASHBOARD TESTS")
+    print("-" * 30)
+    tester.test_dashboard_summary()
+    tester.test_attendance_report()
+    tester.test_metrics()
+    tester.test_health_ready()
+    tester.test_slow_queries()
     
     # Print final results
     print("\n" + "=" * 60)
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_login_throttle")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+class UnreachableDatabase:
+    def __getattr__(self, name):
+        raise AssertionError(f"throttled request touched db.{name}")
+
+
+@pytest.fixture
+def throttle(monkeypatch):
+    throttle = server.LoginThrottle("memory", 1000, 2, 1, 100, 60)
+    monkeypatch.setattr(server, "login_throttle", throttle)
+    monkeypatch.setattr(server, "db", UnreachableDatabase())
+    verify_calls = []
+
+    async def verify(plain_password, hashed_password):
+        verify_calls.append(plain_password)
+        return False
+
+    monkeypatch.setattr(server.password_hasher, "verify", verify)
+    throttle.verify_calls = verify_calls
+    return throttle
+
+
+def exhaust(throttle, username, ip):
+    async def run():
+        while True:
+            try:
+                await throttle.check(username, ip)
+            except server.HTTPException:
+                return
+    asyncio.run(run())
+
+
+def test_over_limit_login_is_rejected_before_password_check(throttle):
+    client = TestClient(server.app)
+    exhaust(throttle, "victim", "testclient")
+
+    response = client.post("/api/auth/login", json={"username": "victim", "password": "guess"})
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert throttle.verify_calls == []
+
+
+def test_username_limit_holds_across_client_addresses(throttle):
+    exhaust(throttle, "victim", "10.0.0.1")
+
+    with pytest.raises(server.HTTPException) as exc:
+        asyncio.run(throttle.check("VICTIM", "10.0.0.2"))
+    assert exc.value.status_code == 429
+
+
+def test_successful_logins_are_refunded():
+    backend = server.MemoryRateLimitBackend(1000)
+
+    async def run():
+        for _ in range(50):
+            assert await backend.take("ip:nat", 5, 0.001) == 0.0
+            await backend.refund("ip:nat", 5, 0.001)
+        for _ in range(5):
+            assert await backend.take("ip:nat", 5, 0.001) == 0.0
+        return await backend.take("ip:nat", 5, 0.001)
+
+    assert asyncio.run(run()) > 0
+    assert backend.size() == 1
+
+
+def test_memory_backend_stays_bounded():
+    backend = server.MemoryRateLimitBackend(10)
+
+    async def run():
+        for i in range(100):
+            await backend.take(f"ip:{i}", 5, 0.001)
+
+    asyncio.run(run())
+    assert backend.size() == 10
@@ -0,0 +1,43 @@
+import base64
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_pagination_cursor")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    values = ["2026-10-16", datetime(2026, 10, 16, 9, 30, tzinfo=timezone.utc), 3, None]
+    assert server.decode_cursor(server.encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize("payload", [
+    [{"$ne": None}],
+    ["2026-10-16", {"$gt": ""}],
+    [{"$dt": "2026-10-16T00:00:00", "$ne": None}],
+    [{"$dt": {"$gt": ""}}],
+    [["nested"]],
+    {"$ne": None},
+    "abc",
+])
+def test_cursor_rejects_operator_injection(payload):
+    with pytest.raises(server.HTTPException) as exc:
+        server.decode_cursor(raw_cursor(payload))
+    assert exc.value.status_code == 400
+
+
+def test_cursor_rejects_garbage():
+    with pytest.raises(server.HTTPException):
+        server.decode_cursor("not-base64-json!")
@@ -0,0 +1,23 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_query_dates")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+def test_padded_date_is_accepted():
+    assert server.parse_query_date("2024-01-05") == "2024-01-05"
+
+
+@pytest.mark.parametrize("value", ["2024-1-5", "2024-01-5", "20240105", "2024-W01-1", "2024-02-30", "", "2024-01-05 "])
+def test_non_canonical_dates_are_rejected(value):
+    with pytest.raises(HTTPException) as exc:
+        server.parse_query_date(value)
+    assert exc.value.status_code == 400